@@ -0,0 +1,44 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def _read_umask():
+    """读取当前umask（只能先设置再改回，期间对整个进程生效，所以只在导入时读取一次）"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# 新建文件的默认权限（与直接open创建的文件一致）
+_DEFAULT_MODE = 0o666 & ~_read_umask()
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8', newline=None):
+    """
+    原子写文件：先写同目录下的临时文件，写完后再替换目标文件
+
+    读取方（浏览器、其他进程）要么看到旧文件，要么看到完整的新文件，不会读到写了一半的内容；
+    写入过程中出错时保留原文件并删除临时文件。
+
+    用法:
+        with atomic_write('report.html') as f:
+            f.write(...)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        if 'b' in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, encoding=encoding, newline=newline)
+        with f:
+            yield f
+        os.chmod(tmp_path, _DEFAULT_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,64 @@
+import argparse
+import random
+import time
+
+from sunburst.classify import DEFAULT_CLASSIFICATION_RULES, CompiledRuleSet, classify_holding
+
+
+def make_rules(rule_count, seed=0):
+    """在默认规则之前插入随机生成的关键词规则，得到指定数量的规则集"""
+    rng = random.Random(seed)
+    default_rules = DEFAULT_CLASSIFICATION_RULES["rules"]
+    syllables = ["华", "夏", "易", "方", "达", "南", "嘉", "实", "广", "发", "富", "国", "招", "商", "工", "银",
+                 "科", "创", "芯", "片", "军", "工", "光", "伏", "新", "材", "料", "半", "导", "体"]
+
+    rules = []
+    for i in range(max(0, rule_count - len(default_rules))):
+        keywords = ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 3)))
+                    for _ in range(rng.randint(1, 4))]
+        rule = {"keywords": keywords, "match_any": rng.random() < 0.7, "category": ["合成", "规则", f"规则{i}"]}
+        if rng.random() < 0.2:
+            rule["exclude"] = ["".join(rng.choice(syllables) for _ in range(2))]
+        elif rng.random() < 0.1:
+            rule["and_keywords"] = ["".join(rng.choice(syllables) for _ in range(2))]
+        rules.append(rule)
+    return rules + default_rules
+
+
+def make_names(count, seed=0):
+    """生成类似基金/股票名称的随机字符串"""
+    rng = random.Random(seed)
+    parts = ["易方达", "华夏", "南方", "中证500", "沪深300", "恒生科技", "医疗", "红利", "低波动", "债券", "国开债",
+             "货币", "ETF", "联接", "A", "C", "混合", "指数", "增强", "港股", "消费", "能源", "证券", "科创芯片"]
+    return ["".join(rng.choice(parts) for _ in range(rng.randint(2, 5))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比classify_holding与CompiledRuleSet的分类性能')
+    parser.add_argument('--names', type=int, default=100000, help='名称数量')
+    parser.add_argument('--rules', type=int, default=300, help='规则数量（含默认规则）')
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    names = make_names(args.names)
+    print(f"规则数: {len(rules)}, 名称数: {len(names)}")
+
+    start = time.perf_counter()
+    expected = [classify_holding(name, rules=rules) for name in names]
+    baseline = time.perf_counter() - start
+    print(f"classify_holding: {baseline:.2f}秒")
+
+    start = time.perf_counter()
+    rule_set = CompiledRuleSet(rules)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = [rule_set.classify(name) for name in names]
+    compiled = time.perf_counter() - start
+    print(f"CompiledRuleSet: 编译 {build:.3f}秒, 分类 {compiled:.2f}秒 (加速 {baseline / compiled:.1f}倍)")
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"结果不一致: {mismatches} 条")
+
+
+if __name__ == "__main__":
+    main()
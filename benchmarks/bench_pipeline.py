@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.fixtures import make_ocr_result, make_portfolio
+from ocr import detect_channel
+from parsers.fund_e import parse_fund_data
+from parsers.haitong import parse_haitong_stock_data
+from parsers.huabao import parse_huabao_stock_data
+from sunburst.classify import ClassificationCache, classify_holding
+from sunburst.sunburst import create_sunburst_data, plot_sunburst, print_portfolio_summary
+
+# 各渠道的解析函数及其输入（文本行或完整的OCR结果）
+PARSERS = {
+    'huabao': (parse_huabao_stock_data, 'lines'),
+    'haitong': (parse_haitong_stock_data, 'ocr'),
+    'fund_e': (parse_fund_data, 'lines'),
+}
+RESULT_VERSION = 1
+
+
+def _lines(ocr_result):
+    return [item[1] for item in ocr_result]
+
+
+def _once(factory):
+    """返回只在第一次调用时执行factory并缓存结果的函数，被过滤掉的用例不生成输入数据"""
+    cache = []
+
+    def get():
+        if not cache:
+            cache.append(factory())
+        return cache[0]
+    return get
+
+
+def _classified(portfolio):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return create_sunburst_data(portfolio(), cache=ClassificationCache())
+
+
+def iter_cases(ocr_rows, holdings, output_dir):
+    """
+    产出 (用例名称, 参数, 准备函数, 被测函数)
+
+    准备函数每次重复前调用一次（不计时），返回被测函数的参数；同一用例的输入数据只在第一次用到时生成
+    """
+    for channel, (parser, input_kind) in PARSERS.items():
+        for rows in ocr_rows:
+            ocr_result = _once(lambda channel=channel, rows=rows: make_ocr_result(channel, rows))
+            lines = _once(lambda ocr_result=ocr_result: _lines(ocr_result()))
+            parser_input = ocr_result if input_kind == 'ocr' else lines
+            params = {'channel': channel, 'rows': rows}
+            yield f"detect_channel/{channel}/rows={rows}", params, lambda lines=lines: (lines(),), detect_channel
+            yield (f"{parser.__name__}/rows={rows}", params,
+                   lambda parser_input=parser_input: (parser_input(),), parser)
+
+    for count in holdings:
+        portfolio = _once(lambda count=count: make_portfolio(count))
+        items = _once(lambda portfolio=portfolio: [(item['name'], item['code']) for item in portfolio()['data']])
+        df = _once(lambda portfolio=portfolio: _classified(portfolio))
+        output_file = os.path.join(output_dir, f"sunburst_{count}.html")
+        params = {'holdings': count}
+        yield (f"classify_holding/holdings={count}", params, lambda items=items: (items(),),
+               lambda items: [classify_holding(name, code) for name, code in items])
+        # 每次使用新的分类缓存，测量的是冷缓存下的完整分类耗时
+        yield (f"create_sunburst_data/holdings={count}", params,
+               lambda portfolio=portfolio: (portfolio(), False, ClassificationCache()), create_sunburst_data)
+        yield (f"plot_sunburst/holdings={count}", params,
+               lambda df=df, output_file=output_file: (df(), output_file), plot_sunburst)
+        yield f"print_portfolio_summary/holdings={count}", params, lambda df=df: (df(),), print_portfolio_summary
+
+
+def measure(setup, func, repeat):
+    """重复调用func(*setup())，返回每次的耗时（秒）；被测函数的输出写入空设备"""
+    timings = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            args = setup()
+            with contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                func(*args)
+                timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _git_revision():
+    """当前提交及工作区是否有未提交的改动，不在git仓库中时返回None"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': bool(dirty)}
+
+
+def environment_info(repeat):
+    import numpy
+    import pandas
+    import plotly
+    return {
+        'version': RESULT_VERSION,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': {'numpy': numpy.__version__, 'pandas': pandas.__version__, 'plotly': plotly.__version__},
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(ocr_rows, holdings, repeat=5, pattern=None):
+    """运行全部（或名称匹配pattern的）用例，返回结果列表"""
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, params, setup, func in iter_cases(ocr_rows, holdings, output_dir):
+            if pattern and not re.search(pattern, name):
+                continue
+            timings = measure(setup, func, repeat)
+            result = {
+                'name': name,
+                'params': params,
+                'min': min(timings),
+                'median': statistics.median(timings),
+                'mean': statistics.mean(timings),
+                'timings': timings,
+            }
+            results.append(result)
+            print(f"{name:<48} 最短 {result['min'] * 1000:>10.3f}ms  中位 {result['median'] * 1000:>10.3f}ms")
+    return results
+
+
+def compare_results(baseline, results, threshold=1.2):
+    """
+    与之前保存的结果比较（按用例名称对应，比较最短耗时），打印变化倍数
+
+    返回变慢超过threshold倍的用例名称列表
+    """
+    previous = {result['name']: result for result in baseline['results']}
+    baseline_git = baseline.get('environment', {}).get('git') or {}
+    print(f"\n===== 与基准比较 (基准提交: {baseline_git.get('commit', '未知')[:12]}) =====")
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            print(f"{result['name']:<48} 新增用例")
+            continue
+        ratio = result['min'] / old['min'] if old['min'] > 0 else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  <-- 变慢'
+            regressions.append(result['name'])
+        elif ratio < 1 / threshold:
+            flag = '  加速'
+        print(f"{result['name']:<48} {old['min'] * 1000:>10.3f}ms -> {result['min'] * 1000:>10.3f}ms "
+              f"({ratio:.2f}倍){flag}")
+    return regressions
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用合成数据测量OCR解析、分类、绘图各阶段的耗时')
+    parser.add_argument('--ocr_rows', type=_int_list, default=[10, 100, 1000],
+                        help='合成截图的持仓条数，逗号分隔，默认10,100,1000')
+    parser.add_argument('--holdings', type=_int_list, default=[10, 1000, 10000, 100000],
+                        help='投资组合的持仓条数，逗号分隔，默认10,1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例重复次数，默认5')
+    parser.add_argument('--quick', action='store_true', help='只运行小规模用例（截图不超过100条、投资组合不超过1000条持仓，重复3次）')
+    parser.add_argument('--filter', help='只运行名称匹配该正则表达式的用例')
+    parser.add_argument('--output', help='结果保存为JSON文件')
+    parser.add_argument('--compare', help='与之前保存的JSON结果比较，有变慢的用例时以非零状态退出')
+    parser.add_argument('--threshold', type=float, default=1.2, help='判定为变慢的耗时倍数，默认1.2')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.ocr_rows = [rows for rows in args.ocr_rows if rows <= 100]
+        args.holdings = [count for count in args.holdings if count <= 1000]
+        args.repeat = min(args.repeat, 3)
+
+    results = run_benchmarks(args.ocr_rows, args.holdings, args.repeat, args.filter)
+    output = {'environment': environment_info(args.repeat), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} 个用例变慢超过 {args.threshold} 倍")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
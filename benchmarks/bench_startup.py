@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import make_portfolio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 各命令行入口不应加载的模块：只看帮助时不需要数据处理和绘图库，加载已保存的OCR结果时不需要OCR引擎
+OCR_MODULES = ('rapidocr_onnxruntime', 'onnxruntime', 'cv2')
+DATA_MODULES = ('pandas', 'plotly')
+
+
+def startup_cases(work_dir):
+    """产出 (用例名称, 命令行参数, 不应加载的模块)"""
+    saved_ocr = os.path.join(work_dir, 'ocr_result.json')
+    with open(saved_ocr, 'w', encoding='utf-8') as f:
+        json.dump(make_portfolio(50), f, ensure_ascii=False)
+    output_html = os.path.join(work_dir, 'portfolio_sunburst.html')
+
+    yield 'ocr.py --help', ['ocr.py', '--help'], OCR_MODULES + DATA_MODULES
+    yield 'portfolio_analyzer.py --help', ['portfolio_analyzer.py', '--help'], OCR_MODULES + DATA_MODULES
+    yield ('portfolio_analyzer.py --use_saved_ocr',
+           ['portfolio_analyzer.py', '--use_saved_ocr', '--save_ocr', saved_ocr, '--output_html', output_html],
+           OCR_MODULES)
+
+
+def run_case(args):
+    """
+    用 -X importtime 运行一次命令，返回 (总耗时, 导入耗时, 导入的模块集合)
+
+    导入耗时为各模块自身导入耗时之和（微秒→秒）
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"命令 {' '.join(args)} 运行失败: {completed.stderr[-2000:]}")
+
+    modules = set()
+    import_time = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 表头
+        import_time += int(fields[0])
+        modules.add(fields[2].strip())
+    return elapsed, import_time / 1e6, modules
+
+
+def loaded(modules, name):
+    """模块name（或其子模块）是否被加载"""
+    return name in modules or any(module.startswith(name + '.') for module in modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量命令行入口的启动耗时，并检查不需要的重量级模块没有被加载')
+    parser.add_argument('--repeat', type=int, default=3, help='每个命令运行次数，取最短耗时，默认3')
+    parser.add_argument('--output', help='结果保存为JSON文件')
+    args = parser.parse_args()
+
+    results = []
+    failed = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, command, forbidden in startup_cases(work_dir):
+            runs = [run_case(command) for _ in range(args.repeat)]
+            elapsed = min(run[0] for run in runs)
+            import_time = min(run[1] for run in runs)
+            modules = runs[0][2]
+            unexpected = [module for module in forbidden if loaded(modules, module)]
+            results.append({'name': name, 'min': elapsed, 'import_time': import_time,
+                            'modules': len(modules), 'unexpected_modules': unexpected})
+            status = f"  <-- 不应加载: {', '.join(unexpected)}" if unexpected else ''
+            print(f"{name:<40} 耗时 {elapsed:>6.3f}秒  导入 {import_time:>6.3f}秒 ({len(modules)}个模块){status}")
+            if unexpected:
+                failed.append(name)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.output}")
+
+    if failed:
+        print(f"{len(failed)} 个命令加载了不需要的模块")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
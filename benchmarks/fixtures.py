@@ -0,0 +1,152 @@
+import random
+
+from benchmarks.bench_classify import make_names
+
+# 合成的基准数据：按固定随机种子生成，与RapidOCR输出格式相同的文本框列表
+# （每项为 [四个顶点坐标, 文本, 置信度]），以及分类前的投资组合数据。不包含任何真实截图或持仓
+
+SCREEN_WIDTH = 1080
+CHAR_WIDTH = 30
+LINE_HEIGHT = 36
+
+_STOCK_PREFIXES = ["中国", "招商", "贵州", "宁德", "长江", "海康", "比亚", "隆基", "万科", "美的", "格力", "恒瑞",
+                   "紫金", "中信", "东方", "立讯", "迈瑞", "伊利", "牧原", "汇川"]
+_STOCK_SUFFIXES = ["银行", "茅台", "时代", "电力", "威视", "迪", "绿能", "集团", "医药", "矿业", "证券", "财富",
+                   "精密", "医疗", "股份", "技术", "能源", "科技"]
+
+
+def _box(x, y, text, rng):
+    """text左上角位于(x, y)的文本框，宽度按字数估算，顶点坐标带少量抖动"""
+    width = max(len(text), 1) * CHAR_WIDTH
+    jitter = [rng.uniform(-1.5, 1.5) for _ in range(4)]
+    points = [[x + jitter[0], y + jitter[1]], [x + width + jitter[2], y + jitter[1]],
+              [x + width + jitter[2], y + LINE_HEIGHT + jitter[3]], [x + jitter[0], y + LINE_HEIGHT + jitter[3]]]
+    return [points, text, round(rng.uniform(0.9, 1.0), 4)]
+
+
+def _stock_name(rng):
+    return rng.choice(_STOCK_PREFIXES) + rng.choice(_STOCK_SUFFIXES)
+
+
+def _stock_code(index):
+    if index % 2:
+        return f"{index % 1000000:06d}.SZ"
+    return f"{600000 + index % 100000:06d}.SH"
+
+
+def make_huabao_ocr(rows, seed=0):
+    """华宝证券持仓截图：表头之后每支股票两行五列，共10个字段"""
+    rng = random.Random(seed)
+    result = []
+    y = 80
+    for header in ("持仓", "买入", "卖出", "撤单", "查询"):
+        result.append(_box(40 + len(result) * 200, y, header, rng))
+    y += 90
+    for x, header in zip((40, 260, 480, 700, 900), ("证券/市值", "成本/现价", "持仓/可用", "累计盈亏", "仓位")):
+        result.append(_box(x, y, header, rng))
+    y += 70
+
+    for i in range(rows):
+        quantity = rng.randrange(100, 50000, 100)
+        price = round(rng.uniform(2, 200), 3)
+        cost = round(price * rng.uniform(0.7, 1.3), 3)
+        profit = round((price - cost) * quantity, 2)
+        first = [_stock_name(rng), f"{cost:.3f}", str(quantity), f"{profit:.2f}", _stock_code(i)]
+        second = [f"{rng.uniform(0.1, 30):.2f}%", f"{price:.3f}", str(quantity),
+                  f"{(price - cost) / cost * 100:.2f}%", f"{price * quantity:.2f}"]
+        for row in (first, second):
+            for x, text in zip((40, 260, 480, 700, 900), row):
+                result.append(_box(x, y, text, rng))
+            y += 50
+        y += 30
+    return result
+
+
+def make_haitong_ocr(rows, seed=0):
+    """海通证券持仓截图：每支股票两行四列（名称/市值、持仓/可用、现价/成本、盈亏/盈亏比）"""
+    rng = random.Random(seed)
+    result = [_box(40, 60, "总资产", rng), _box(300, 60, f"{rng.uniform(1e4, 1e7):.2f}", rng),
+              _box(40, 140, "当日预估盈亏", rng), _box(40, 220, "当前持仓", rng)]
+    columns = (40, 330, 600, 850)
+    for x, header in zip(columns, ("股票/市值", "持仓/可用", "现价/成本", "盈亏/盈亏比")):
+        result.append(_box(x, 290, header, rng))
+
+    y = 370
+    for _ in range(rows):
+        quantity = rng.randrange(100, 50000, 100)
+        price = round(rng.uniform(2, 200), 3)
+        cost = round(price * rng.uniform(0.7, 1.3), 3)
+        profit = (price - cost) * quantity
+        first = [_stock_name(rng), str(quantity), f"{price:.3f}", f"{profit:+.2f}"]
+        second = [f"{price * quantity:.2f}", str(quantity), f"{cost:.3f}", f"{(price - cost) / cost * 100:+.2f}%"]
+        for row in (first, second):
+            for x, text in zip(columns, row):
+                result.append(_box(x, y, text, rng))
+            y += 60
+        y += 40
+    result.append(_box(380, y + 40, "以上是全部持仓", rng))
+    return result
+
+
+def make_fund_e_ocr(rows, seed=0):
+    """基金e账户持仓截图：基金名称（部分带代码或折成两行）后接持有份额、参考净值、资产情况"""
+    rng = random.Random(seed)
+    names = make_names(rows, seed)
+    result = [_box(400, 60, "基金e账户", rng), _box(40, 140, "我的持有", rng), _box(900, 140, "筛选", rng)]
+
+    y = 230
+    for i, name in enumerate(names):
+        name_lines = [name]
+        if rng.random() < 0.6:
+            name_lines[-1] += f"({rng.randrange(1000000):06d})"
+        if len(name) > 8 and rng.random() < 0.3:
+            name_lines = [name_lines[0][:8], name_lines[0][8:]]
+        for line in name_lines:
+            result.append(_box(40, y, line, rng))
+            y += 45
+
+        shares = rng.uniform(100, 200000)
+        nav = rng.uniform(0.5, 5)
+        for x, header in zip((40, 400, 760), ("持有份额", "参考净值", "资产情况")):
+            result.append(_box(x, y, header, rng))
+        y += 45
+        for x, text in zip((40, 400, 760), (f"{shares:,.2f}", f"{nav:.4f}", f"{shares * nav:,.2f}")):
+            result.append(_box(x, y, text, rng))
+        y += 80
+    return result
+
+
+OCR_FIXTURES = {
+    'huabao': make_huabao_ocr,
+    'haitong': make_haitong_ocr,
+    'fund_e': make_fund_e_ocr,
+}
+
+
+def make_ocr_result(channel, rows, seed=0):
+    """指定渠道、持仓条数的合成OCR结果"""
+    return OCR_FIXTURES[channel](rows, seed)
+
+
+def make_portfolio(count, seed=0):
+    """
+    分类前的投资组合数据（与ocr.process_images的结果格式相同），包含count条持仓
+
+    名称与bench_classify相同，由常见基金名称片段随机拼接，会命中各类分类规则
+    """
+    rng = random.Random(seed)
+    channels = ('huabao', 'haitong', 'fund_e')
+    data = []
+    for i, name in enumerate(make_names(count, seed)):
+        channel = channels[i % len(channels)]
+        quantity = round(rng.uniform(100, 100000), 2)
+        price = rng.uniform(0.5, 200)
+        data.append({
+            'name': name,
+            'code': f"{rng.randrange(1000000):06d}",
+            'quantity': quantity,
+            'current_price': round(price, 4),
+            'market_value': round(quantity * price, 2),
+            'source_type': channel,
+        })
+    return {'data': data, 'sources': list(channels)}
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+
+from atomic_write import atomic_write
+from ocr_cache import OCRCache
+
+# 与ocr.iter_process_images批量模式识别的图片类型一致
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def list_images(image_path):
+    """返回 (图片目录, 排序后的图片文件名列表)，image_path为单张图片时列表只有这一张"""
+    if os.path.isdir(image_path):
+        return image_path, sorted(f for f in os.listdir(image_path) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return os.path.dirname(image_path), [os.path.basename(image_path)]
+
+
+def content_digest(payload):
+    """任意可序列化内容的指纹"""
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class BuildManifest:
+    """
+    增量构建清单
+
+    记录每张截图的修改时间、大小、内容哈希，以及它在每个阶段的产物：
+    解析出的投资记录（依赖图片内容和OCR参数）、分类后的持仓（还依赖分类规则指纹）。
+    再次运行时只对改动过的图片重新OCR，只对解析结果或规则变化的图片重新分类；
+    汇总输入（各图片内容、分类规则、现金和输出参数）的指纹不变时跳过生成图表和报告。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            data = {'version': self.VERSION, 'ocr_options': None, 'images': {}, 'output_digest': None}
+        return data
+
+    @property
+    def images(self):
+        return self.data['images']
+
+    def save(self):
+        """写入清单（先写临时文件再替换）"""
+        with atomic_write(self.path) as f:
+            json.dump(self.data, f, ensure_ascii=False)
+
+    def changed_images(self, image_dir, image_files, ocr_options):
+        """
+        找出需要重新OCR的图片，并删除已不存在的图片记录
+
+        修改时间和大小都没变的图片直接认为未改动；变了的再比较内容哈希，
+        内容相同（例如只是被touch或复制）的只更新记录，不重新识别。
+        OCR参数（渠道、分块、预处理、解析器版本）变化时所有图片都要重新识别。
+        上次识别出错或运行被中断、还没有记录处理结果的图片总是重新识别；
+        已识别但没有持仓的图片（空白或非持仓截图）与其他图片一样，没改动就跳过。
+        """
+        if self.data['ocr_options'] != ocr_options:
+            self.data['ocr_options'] = ocr_options
+            self.images.clear()
+
+        for file_name in set(self.images) - set(image_files):
+            del self.images[file_name]
+
+        changed = []
+        for file_name in image_files:
+            path = os.path.join(image_dir, file_name)
+            stat = os.stat(path)
+            entry = self.images.get(file_name)
+            if entry is not None and not entry.get('processed'):
+                entry = None
+            if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                continue
+
+            image_hash = OCRCache.file_hash(path)
+            if entry is not None and entry['hash'] == image_hash:
+                entry['mtime'], entry['size'] = stat.st_mtime, stat.st_size
+                continue
+
+            self.images[file_name] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': image_hash,
+                                      'processed': False, 'channel': None, 'data': None,
+                                      'rules': None, 'holdings': None}
+            changed.append(file_name)
+        return changed
+
+    def record_parsed(self, file_name, channel, data):
+        """
+        记录一张图片的解析结果，之前的分类结果随之失效
+
+        data为None表示处理出错，下次运行重新识别；空列表表示已识别但没有持仓，图片不变就不再识别
+        """
+        entry = self.images[file_name]
+        entry['processed'] = data is not None
+        entry['channel'], entry['data'] = channel, data
+        entry['rules'], entry['holdings'] = None, None
+
+    def unclassified(self, fingerprint):
+        """解析成功但还没有按当前规则分类的图片"""
+        return [file_name for file_name, entry in self.images.items()
+                if entry['data'] and entry['rules'] != fingerprint]
+
+    def record_holdings(self, file_name, fingerprint, holdings):
+        entry = self.images[file_name]
+        entry['rules'], entry['holdings'] = fingerprint, holdings
+
+    def output_current(self, digest, outputs):
+        """汇总输入的指纹与上次生成时相同，并且上次的输出文件都还在"""
+        return self.data['output_digest'] == digest and all(os.path.exists(path) for path in outputs)
+
+    def record_output(self, digest):
+        self.data['output_digest'] = digest
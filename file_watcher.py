@@ -0,0 +1,143 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify事件（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# 文件写完、移入、删除、移出时通知；不监听IN_CREATE，避免文件还没写完就开始处理
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """通过ctypes加载libc中的inotify接口，不可用（非Linux等）时返回None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DirectoryWatcher:
+    """
+    监听文件夹中的文件变化
+
+    优先使用inotify（Linux，通过ctypes调用，无需额外依赖），不可用时退化为定时扫描文件夹。
+    wait()阻塞到有文件变化为止，并在一批变化后等待debounce秒内不再有新变化（例如一次同步多张截图），
+    再一起返回这批变化的文件名。
+    """
+
+    def __init__(self, directory, extensions=None, debounce=2.0, poll_interval=1.0, use_inotify=True):
+        self.directory = directory
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._snapshot = None
+
+        libc = _load_inotify() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                if libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK) >= 0:
+                    self._fd = fd
+                else:
+                    os.close(fd)
+
+        if self._fd is None:
+            self._snapshot = self._scan()
+        self.backend = 'inotify' if self._fd is not None else 'polling'
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _wanted(self, name):
+        return not name.startswith('.') and (self.extensions is None or name.lower().endswith(self.extensions))
+
+    def _scan(self):
+        """文件夹中各文件的 (修改时间, 大小)"""
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and self._wanted(entry.name):
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _read_inotify(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                break
+
+            data = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，无法知道具体文件，按整个文件夹有变化处理
+                    changed.add(self.directory)
+                elif name and self._wanted(name):
+                    changed.add(name)
+        return changed
+
+    def _read_polling(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {name for name in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(name) != self._snapshot.get(name)}
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            delay = self.poll_interval if deadline is None else min(self.poll_interval, deadline - time.monotonic())
+            time.sleep(max(delay, 0))
+
+    def _read(self, timeout):
+        """等待最多timeout秒（None为一直等待），返回这段时间内变化的文件名"""
+        if self._fd is not None:
+            return self._read_inotify(timeout)
+        return self._read_polling(timeout)
+
+    def wait(self):
+        """阻塞到有文件变化，合并随后debounce秒内的连续变化，返回变化的文件名集合"""
+        changed = set()
+        while not changed:
+            changed |= self._read(None)
+        while True:
+            more = self._read(self.debounce)
+            if not more:
+                return changed
+            changed |= more
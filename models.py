@@ -1,7 +1,16 @@
+import math
+import sys
+from array import array
+
+
 # 统一的投资信息类
 class InvestmentInfo:
-    def __init__(self, name=None, code=None, quantity=None, market_value=None, 
-                 cost_price=None, current_price=None, position_ratio=None, 
+    # 使用__slots__，每条记录不再单独分配__dict__
+    __slots__ = ('name', 'code', 'quantity', 'market_value', 'cost_price', 'current_price',
+                 'position_ratio', 'profit_ratio', 'profit_amount')
+
+    def __init__(self, name=None, code=None, quantity=None, market_value=None,
+                 cost_price=None, current_price=None, position_ratio=None,
                  profit_ratio=None, profit_amount=None):
         # 通用字段
         self.name = name      # 名称
@@ -15,4 +24,162 @@ class InvestmentInfo:
         self.profit_amount = profit_amount  # 盈亏金额
 
     def to_dict(self):
-        return {k: v for k, v in self.__dict__.items() if v is not None}
+        result = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        return result
+
+
+# 除名称、代码、市值外的其余投资信息字段，随分类后的持仓记录一起保留
+DETAIL_FIELDS = ('quantity', 'cost_price', 'current_price', 'position_ratio', 'profit_ratio', 'profit_amount')
+
+
+class _StringColumn:
+    """字符串列：每个不同的字符串只保存一份（并驻留），每行只存一个整数编号"""
+
+    __slots__ = ('codes', 'values', 'index')
+
+    def __init__(self):
+        self.codes = array('i')
+        self.values = []
+        self.index = {}
+
+    def append(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value))
+            self.index[value] = code
+        self.codes = _append(self.codes, code)
+
+
+def _append(column, value):
+    """向array追加一个值并返回该数组；数组正被to_dataframe得到的数据框共用时先复制一份再追加"""
+    try:
+        column.append(value)
+    except BufferError:
+        column = array(column.typecode, column)
+        column.append(value)
+    return column
+
+
+def _to_float(value):
+    """宽松地转为浮点数：去掉千分位逗号，缺失或无法识别的值（例如'--'）记为NaN"""
+    if value is None:
+        return math.nan
+    if isinstance(value, str):
+        value = value.replace(',', '').strip()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _to_str(value):
+    """字符串列的值：None和NaN记为空字符串，其余非字符串（例如JSON中写成数字的代码）转为字符串"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+class HoldingsTable:
+    """
+    按列存储的持仓表
+
+    名称、代码、来源和三级分类按列驻留编号，市值和其余投资信息存为float64数组（缺失为NaN），
+    每条持仓只占几十字节，不再为每条记录保存一个字典；to_dataframe直接用这些数组构建数据框，
+    数值列不复制。
+
+    OCR结果中的投资记录可以直接追加进来（此时还没有分类，三级分类为空字符串），
+    流水线把分类后的持仓记录追加进来。
+    """
+
+    STRING_FIELDS = ('name', 'code', 'source', 'level1', 'level2', 'level3')
+    NUMBER_FIELDS = ('value',) + DETAIL_FIELDS
+    # 分类列在汇总时要按多列分组，转为数据框时解码为普通字符串列（分类数很少，解码的开销可以忽略）
+    DECODED_FIELDS = ('level1', 'level2', 'level3')
+
+    def __init__(self, records=None):
+        self._strings = {field: _StringColumn() for field in self.STRING_FIELDS}
+        self._numbers = {field: array('d') for field in self.NUMBER_FIELDS}
+        self._length = 0
+        if records is not None:
+            self.extend(records)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, name, code, value, source='未知', level1='', level2='', level3='', **details):
+        """
+        追加一条持仓，value为None表示缺少市值；details为DETAIL_FIELDS中的字段，无法转为数值的记为NaN。
+        名称、代码等非字符串值（例如JSON中写成数字的代码）转为字符串，None和NaN记为空字符串
+        """
+        strings = self._strings
+        strings['name'].append(_to_str(name))
+        strings['code'].append(_to_str(code))
+        strings['source'].append(_to_str(source))
+        strings['level1'].append(_to_str(level1))
+        strings['level2'].append(_to_str(level2))
+        strings['level3'].append(_to_str(level3))
+
+        numbers = self._numbers
+        numbers['value'] = _append(numbers['value'], _to_float(value))
+        for field in DETAIL_FIELDS:
+            numbers[field] = _append(numbers[field], _to_float(details.get(field)))
+        self._length += 1
+
+    def append_record(self, record):
+        """
+        追加一条投资记录：InvestmentInfo、解析器产出的字典（market_value/source_type），
+        或分类后的持仓字典（value/source/level1-3）
+        """
+        if isinstance(record, InvestmentInfo):
+            self.append(record.name, record.code, record.market_value,
+                        **{field: getattr(record, field) for field in DETAIL_FIELDS})
+            return
+
+        value = record['value'] if 'value' in record else record.get('market_value')
+        source = record['source'] if 'source' in record else record.get('source_type', '未知')
+        self.append(record.get('name', ''), record.get('code', ''), value, source,
+                    record.get('level1', ''), record.get('level2', ''), record.get('level3', ''),
+                    **{field: record.get(field) for field in DETAIL_FIELDS})
+
+    def extend(self, records):
+        for record in records:
+            self.append_record(record)
+        return self
+
+    def to_dataframe(self):
+        """
+        转为数据框，列与create_sunburst_data的结果一致
+
+        数值列直接共用表中的数组（之后再追加时表会自动复制一份，已生成的数据框不受影响），
+        名称、代码、来源为按字典序排列类别的Categorical，三级分类为普通字符串列；
+        全部为空的明细列不输出
+        """
+        import numpy as np
+        import pandas as pd
+
+        data = {}
+        for field in ('name', 'code', 'value', 'level1', 'level2', 'level3', 'source') + DETAIL_FIELDS:
+            if field in self._numbers:
+                values = np.frombuffer(self._numbers[field], dtype=np.float64)
+                if field in DETAIL_FIELDS and np.isnan(values).all():
+                    continue
+                data[field] = values
+                continue
+
+            column = self._strings[field]
+            codes = np.frombuffer(column.codes, dtype=np.int32)
+            if field in self.DECODED_FIELDS:
+                data[field] = np.array(column.values, dtype=object)[codes] if len(codes) else np.array([], dtype=object)
+            else:
+                # 类别按字典序排列，分组、排序结果与普通字符串列一致
+                order = sorted(range(len(column.values)), key=column.values.__getitem__)
+                remap = np.empty(len(order), dtype=np.int32)
+                remap[order] = np.arange(len(order), dtype=np.int32)
+                data[field] = pd.Categorical.from_codes(remap[codes] if len(order) else codes,
+                                                        [column.values[i] for i in order])
+        return pd.DataFrame(data, copy=False)
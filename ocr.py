@@ -1,132 +1,662 @@
 from pprint import pprint
 
-from PIL import Image
-from rapidocr_onnxruntime import RapidOCR
 import re
 import argparse
 import os
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-from parsers.fund_e import parse_fund_data
-from parsers.haitong import parse_haitong_stock_data
-from parsers.huabao import parse_huabao_stock_data
+from ocr_cache import OCRCache
+from parsers import PARSER_VERSION
+from profiling import add_profile_arguments, disable as disable_profiling, profile_session, span
+from stitch import iter_stitched
+
+# PIL、rapidocr_onnxruntime（onnxruntime、cv2）和各渠道的解析器（numpy）在用到时才导入，
+# 只查看帮助或加载已保存OCR结果的运行不必承担这些模块的导入耗时
+
+# OCR引擎配置：普通模式和大图片模式（超过LARGE_IMAGE_SIDE像素的图片）
+ENGINE_CONFIGS = {
+    'normal': {},
+    'large': {'max_side_len': 100000},
+}
+LARGE_IMAGE_SIDE = 5000
+
+# 长截图分块识别：超过LARGE_IMAGE_SIDE的竖长图片切成相互重叠的水平条带，
+# 每个条带用普通引擎按原分辨率识别，代替在整张大图上用max_side_len=100000做检测。
+# 条带依次识别：引擎不能被多个线程同时使用，onnxruntime单次推理本身已经用满所有核
+TILE_CONFIG = {'tile_height': 2000, 'tile_overlap': 200}
+
+# 可选的预处理阶段：灰度化、按目标文字高度缩小、裁掉持仓列表以外的页头页尾。
+# 裁剪范围由粗识别（缩略图上只识别顶部和底部两段）找到的锚点文本决定
+PREPROCESS_CONFIG = {
+    'target_text_height': 32,  # 缩小后的目标文字高度（像素），只缩小不放大
+    'probe_width': 540,        # 粗识别缩略图宽度
+    'probe_band': 800,         # 粗识别的顶部/底部区域高度（原图像素）
+    'margin': 20,              # 锚点外额外保留的像素（原图像素）
+}
+# 各渠道持仓区域的锚点：top锚点所在行（含）以下、bottom锚点所在行（含）以上为持仓区域，
+# 锚点行本身保留，解析器仍依赖它们定位数据
+CROP_ANCHORS = {
+    'haitong': {'top': ['当前持仓', '股票/市值'], 'bottom': ['以上是全部']},
+    'huabao': {'top': ['证券/市值', '成本/现价', '持仓/可用'], 'bottom': []},
+    'fund_e': {'top': ['筛选'], 'bottom': []},
+}
+
+# 引擎注册表：按配置名缓存RapidOCR实例，整个进程内共享。
+# RapidOCR实例不是线程安全的（检测时会按当前图片尺寸改写预处理参数），
+# 多个线程同时推理时每个线程调用use_thread_engines()后使用自己的引擎
+_engines = {}
+_thread_engines = threading.local()
+# 对所有引擎生效的附加参数（例如工作进程中限制onnxruntime线程数）
+_engine_options = {}
+_engines_lock = threading.Lock()
+
+# 耗时统计：引擎冷启动耗时和每张图片的推理耗时分开记录。
+# 推理耗时只保留最近的INFERENCE_STATS_LIMIT条，常驻服务长期运行时不会无限增长
+INFERENCE_STATS_LIMIT = 10000
+_ocr_stats = {'cold_start': {}, 'inference': deque(maxlen=INFERENCE_STATS_LIMIT)}
+
+
+def _create_engine(mode, label):
+    from rapidocr_onnxruntime import RapidOCR
+
+    start = time.perf_counter()
+    with span('ocr.engine_load', mode=mode):
+        engine = RapidOCR(**ENGINE_CONFIGS[mode], **_engine_options)
+    elapsed = time.perf_counter() - start
+    _ocr_stats['cold_start'][label] = elapsed
+    print(f"OCR引擎({label})冷启动耗时: {elapsed:.2f}秒")
+    return engine
+
+
+def use_thread_engines():
+    """当前线程之后通过get_engine获取的都是本线程独占的引擎"""
+    if getattr(_thread_engines, 'engines', None) is None:
+        _thread_engines.engines = {}
+
+
+def get_engine(mode='normal'):
+    """获取指定配置的OCR引擎，首次使用时才创建"""
+    thread_engines = getattr(_thread_engines, 'engines', None)
+    if thread_engines is not None:
+        engine = thread_engines.get(mode)
+        if engine is None:
+            engine = thread_engines[mode] = _create_engine(mode, f"{mode}@{threading.current_thread().name}")
+        return engine
+
+    engine = _engines.get(mode)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(mode)
+        if engine is None:
+            engine = _engines[mode] = _create_engine(mode, mode)
+    return engine
+
+
+def warm_up_engines(modes=('normal',)):
+    """预先加载OCR引擎，避免第一张图片承担模型加载耗时"""
+    for mode in modes:
+        get_engine(mode)
+
+
+def close_engines():
+    """释放所有已加载的OCR引擎"""
+    with _engines_lock:
+        _engines.clear()
+    _thread_engines.engines = None
+
+
+def select_engine_mode(width, height, tile=True):
+    """仅根据图片尺寸决定OCR引擎配置，竖长大图默认使用分块识别"""
+    if max(width, height) <= LARGE_IMAGE_SIDE:
+        return 'normal'
+    if tile and height > width:
+        return 'tiled'
+    return 'large'
+
+
+def get_ocr_stats():
+    """返回引擎冷启动和推理耗时统计"""
+    return {
+        'cold_start': dict(_ocr_stats['cold_start']),
+        'inference': list(_ocr_stats['inference']),
+    }
+
+
+def reset_ocr_stats():
+    """清空耗时统计（已加载的引擎不受影响）"""
+    _ocr_stats['cold_start'].clear()
+    _ocr_stats['inference'].clear()
+
+
+def print_ocr_stats(stats=None):
+    """打印冷启动耗时和推理耗时汇总"""
+    stats = stats or get_ocr_stats()
+    cold_start = stats['cold_start']
+    inference = stats['inference']
+    if cold_start:
+        details = ', '.join(f"{mode} {seconds:.2f}秒" for mode, seconds in cold_start.items())
+        print(f"引擎冷启动耗时: {sum(cold_start.values()):.2f}秒 ({details})")
+    if inference:
+        total = sum(seconds for _, seconds in inference)
+        print(f"OCR推理耗时: 共{total:.2f}秒, {len(inference)}张图片, 平均{total / len(inference):.2f}秒/张")
+
+
+# 各渠道的特征，每个特征是一组可互相替代的关键词，任一关键词出现在任一行即算命中
+CHANNEL_FEATURES = {
+    'huabao': [('.SH', '.SZ'), ('成本/现价',), ('证券/市值',), ('持仓/可用',), ('华宝',)],
+    'haitong': [('当前持仓',), ('以上是全部',), ('股票/市值', '持仓/可用'), ('盈亏/盈亏比',), ('海通',)],
+    'fund_e': [('筛选',), ('基金e账户',)],
+}
+# 基金e账户的另外两个特征：持有份额的下一行是参考净值、出现基金代码
+FUND_E_HEADER = ('持有份额', '参考净值')
+FUND_CODE_PATTERN = r'[（\(]\d{6}[）\)]'
+# 所有渠道特征都未命中时的兜底判断用到的关键词
+FALLBACK_KEYWORDS = ('持仓', '盈亏', '以上是全部', '资产情况')
+# 特征得分相同时的优先顺序
+CHANNEL_PRIORITY = ('huabao', 'haitong', 'fund_e')
+
+_CHANNEL_KEYWORDS = sorted(
+    {kw for features in CHANNEL_FEATURES.values() for feature in features for kw in feature}
+    | set(FUND_E_HEADER) | set(FALLBACK_KEYWORDS),
+    key=len, reverse=True)
+# 多模式匹配：一次正则扫描找出包含任一关键词或基金代码的行，绝大多数数值行在这里直接跳过。
+# 开头的字符集前瞻让正则引擎只在可能的首字符处尝试各个分支
+_CHANNEL_MATCHER = re.compile('(?=[{}])(?:{})'.format(
+    re.escape(''.join(sorted({kw[0] for kw in _CHANNEL_KEYWORDS} | {'(', '（'}))),
+    '|'.join([re.escape(kw) for kw in _CHANNEL_KEYWORDS] + [FUND_CODE_PATTERN])))
+_FUND_CODE_RE = re.compile(FUND_CODE_PATTERN)
+
+
+def _scan_channel_keywords(lines):
+    """单次遍历OCR文本，返回 (出现过的关键词集合, 是否有持有份额/参考净值相邻行, 是否有基金代码)"""
+    found = set()
+    header_adjacent = False
+    fund_code_found = False
+    total = len(_CHANNEL_KEYWORDS)
+
+    # 拼接后整体扫描一次，只有包含关键词的行才需要逐个确认
+    text = '\n'.join(lines)
+    line_starts = [0] + list(accumulate(len(line) + 1 for line in lines[:-1]))
+    last_line = -1
+
+    for match in _CHANNEL_MATCHER.finditer(text):
+        i = bisect_right(line_starts, match.start()) - 1
+        if i == last_line:
+            continue
+        last_line = i
+        line = lines[i]
+
+        # 关键词之间存在包含关系，不能只看正则匹配到的那一个
+        for kw in _CHANNEL_KEYWORDS:
+            if kw not in found and kw in line:
+                found.add(kw)
+        if not header_adjacent and i > 0 and FUND_E_HEADER[1] in line and FUND_E_HEADER[0] in lines[i - 1]:
+            header_adjacent = True
+        if not fund_code_found and _FUND_CODE_RE.search(line):
+            fund_code_found = True
+
+        # 所有特征都已确定，后面的行不会改变结果
+        if len(found) == total and header_adjacent and fund_code_found:
+            break
+
+    return found, header_adjacent, fund_code_found
+
+
+def detect_channel_scores(lines):
+    """
+    检测OCR文本渠道类型，并给出判断依据
+
+    返回:
+        dict: channel为检测到的渠道（无法确定时为None），scores为各渠道命中的特征数，
+        matched为各渠道命中的特征，confidence为所选渠道命中特征的比例（兜底判断时为0），
+        fallback表示是否由兜底规则决定
+    """
+    found, header_adjacent, fund_code_found = _scan_channel_keywords(lines)
+
+    matched = {
+        channel: ['|'.join(feature) for feature in features if any(kw in found for kw in feature)]
+        for channel, features in CHANNEL_FEATURES.items()
+    }
+    if header_adjacent:
+        matched['fund_e'].append('+'.join(FUND_E_HEADER))
+    if fund_code_found:
+        matched['fund_e'].append('基金代码')
+
+    scores = {channel: len(matched[channel]) for channel in CHANNEL_PRIORITY}
+    feature_counts = {channel: len(features) for channel, features in CHANNEL_FEATURES.items()}
+    feature_counts['fund_e'] += 2
+
+    result = {'channel': None, 'scores': scores, 'matched': matched, 'confidence': 0.0, 'fallback': False}
+
+    # 根据特征匹配数决定类型
+    max_score = max(scores.values())
+    if max_score > 0:
+        channel = next(channel for channel in CHANNEL_PRIORITY if scores[channel] == max_score)
+        result['channel'] = channel
+        result['confidence'] = round(max_score / feature_counts[channel], 3)
+        return result
+
+    # 如果无法确定，检查更多特定特征
+    result['fallback'] = True
+    if '持仓' in found and '盈亏' in found:
+        # 进一步区分华宝和海通
+        result['channel'] = 'haitong' if '以上是全部' in found else 'huabao'
+    elif '资产情况' in found:
+        result['channel'] = 'fund_e'
+    return result
 
 
 # 自动检测渠道类型
 def detect_channel(lines):
-    """自动检测OCR文本渠道类型（华宝证券、海通证券或基金e账户）"""
-    # 检查是否包含华宝证券特征
-    huabao_features = [
-        any(".SH" in line or ".SZ" in line for line in lines),
-        any("成本/现价" in line for line in lines),
-        any("证券/市值" in line for line in lines),
-        any("持仓/可用" in line for line in lines),
-        any("华宝" in line for line in lines)
-    ]
-    
-    # 检查是否包含海通证券格式特征
-    haitong_features = [
-        any("当前持仓" in line for line in lines),
-        any("以上是全部" in line for line in lines),
-        any("股票/市值" in line for line in lines) or any("持仓/可用" in line for line in lines),
-        any("盈亏/盈亏比" in line for line in lines),
-        any("海通" in line for line in lines)
-    ]
-    
-    # 检查是否包含基金e账户特征
-    fund_e_features = [
-        any("持有份额" in line and i+1 < len(lines) and "参考净值" in lines[i+1] for i, line in enumerate(lines)),
-        any("筛选" in line for line in lines),
-        any(re.search(r'[（\(]\d{6}[）\)]', line) for line in lines),  # 基金代码格式
-        any("基金e账户" in line for line in lines)
-    ]
-    
-    # 统计特征匹配数
-    huabao_score = sum(huabao_features)
-    haitong_score = sum(haitong_features)
-    fund_e_score = sum(fund_e_features)
-    
-    # 根据特征匹配数决定类型
-    max_score = max(huabao_score, haitong_score, fund_e_score)
-    
-    if max_score == huabao_score and huabao_score > 0:
-        return "huabao"  # 华宝证券
-    elif max_score == haitong_score and haitong_score > 0:
-        return "haitong"  # 海通证券
-    elif max_score == fund_e_score and fund_e_score > 0:
-        return "fund_e"  # 基金e账户
-    else:
-        # 如果无法确定，检查更多特定特征
-        if any("持仓" in line for line in lines) and any("盈亏" in line for line in lines):
-            # 进一步区分华宝和海通
-            if any("以上是全部" in line for line in lines):
-                return "haitong"
-            else:
-                return "huabao"
-        elif any("资产情况" in line for line in lines):
-            return "fund_e"
+    """自动检测OCR文本渠道类型（华宝证券、海通证券或基金e账户），无法确定时返回None"""
+    return detect_channel_scores(lines)['channel']
+
+def engine_config(mode):
+    """返回影响OCR结果的引擎配置，作为OCR缓存键的一部分"""
+    if mode == 'tiled':
+        return {'mode': mode, **ENGINE_CONFIGS['normal'], **TILE_CONFIG}
+    return {'mode': mode, **ENGINE_CONFIGS[mode]}
+
+
+def split_tiles(height, tile_height, overlap):
+    """
+    把图片高度切分为相互重叠的条带
+
+    返回:
+        [(top, bottom, own_top, own_bottom)]，前两项是条带的裁剪范围；
+        后两项是该条带负责的区域，以重叠区的中线为界，文本框中心落在哪个条带的负责区域就归哪个条带，
+        这样重叠区里被两个条带同时识别到的文本只会保留一次。
+    """
+    step = tile_height - overlap
+    tiles = []
+    top = 0
+    while True:
+        bottom = min(top + tile_height, height)
+        own_top = top + overlap / 2 if top > 0 else 0
+        own_bottom = bottom - overlap / 2 if bottom < height else height
+        tiles.append((top, bottom, own_top, own_bottom))
+        if bottom >= height:
+            break
+        top += step
+    return tiles
+
+
+def _ocr_tiles(image, engine):
+    """分块识别竖长图片（路径或PIL图片），把文本框映射回整图坐标并去掉重叠区的重复结果"""
+    if isinstance(image, str):
+        from PIL import Image
+
+        with Image.open(image) as img:
+            img.load()
+            return _ocr_tiles(img, engine)
+
+    tile_height = TILE_CONFIG['tile_height']
+    overlap = TILE_CONFIG['tile_overlap']
+    width, height = image.size
+    tiles = split_tiles(height, tile_height, overlap)
+
+    tile_results = []
+    for top, bottom, _, _ in tiles:
+        tile_result, _ = engine(image.crop((0, top, width, bottom)))
+        tile_results.append(tile_result or [])
+
+    print(f"分块识别: {len(tiles)}个条带 (条带高度{tile_height}, 重叠{overlap})")
+
+    ocr_result = []
+    for (top, _, own_top, own_bottom), tile_result in zip(tiles, tile_results):
+        for box, text, score in tile_result:
+            box = [[x, y + top] for x, y in box]
+            center_y = sum(y for _, y in box) / len(box)
+            if own_top <= center_y < own_bottom:
+                ocr_result.append([box, text, score])
+    return ocr_result
+
+
+def run_ocr(image, mode, label=None):
+    """
+    使用指定配置的引擎识别图片，返回统一为纯Python类型的原始结果列表
+
+    参数:
+        image: 图片路径或PIL图片（预处理后的图片）
+        mode: 引擎配置名
+        label: 耗时统计中使用的图片名称，默认取路径的文件名
+    """
+    engine = get_engine('normal' if mode == 'tiled' else mode)
+    label = label or os.path.basename(image)
+
+    start = time.perf_counter()
+    with span('ocr.inference', image=label, mode=mode):
+        if mode == 'tiled':
+            ocr_result = _ocr_tiles(image, engine)
         else:
-            return None  # 无法确定渠道
+            ocr_result, _ = engine(image)
+    elapsed = time.perf_counter() - start
+    _ocr_stats['inference'].append((label, elapsed))
+    print(f"OCR推理耗时: {elapsed:.2f}秒")
 
-def process_image(image_path, channel='auto'):
-    """处理单个图片"""
-    try:
-        # 检查图片尺寸
-        img = Image.open(image_path)
-        width, height = img.size
-        max_side = max(width, height)
-        
-        # 仅根据图片尺寸决定OCR引擎配置
-        if max_side > 5000:
-            print(f"使用大图片模式进行OCR (尺寸: {width}x{height})")
-            engine = RapidOCR(max_side_len=100000)
+    # 转换为可JSON序列化的[文本框, 文本, 置信度]
+    return [[[[float(x), float(y)] for x, y in box], text, float(score)]
+            for box, text, score in (ocr_result or [])]
+
+
+def _probe_image(img, engine, channel='auto'):
+    """粗识别：在缩略图上只识别顶部和底部两段，返回原图坐标下的 [(文本框, 文本)]"""
+    width, height = img.size
+    scale = min(1.0, PREPROCESS_CONFIG['probe_width'] / width)
+    band = PREPROCESS_CONFIG['probe_band']
+
+    bands = [(0, min(height, band))]
+    # 已知渠道且没有底部锚点时不必识别底部
+    need_bottom = channel == 'auto' or CROP_ANCHORS.get(channel, {}).get('bottom')
+    if height > band and need_bottom:
+        bands.append((max(band, height - band), height))
+
+    probe_result = []
+    for top, bottom in bands:
+        band_img = img.crop((0, top, width, bottom))
+        if scale < 1:
+            band_img = band_img.resize((max(1, round(width * scale)), max(1, round((bottom - top) * scale))))
+        # 粗识别只需找到锚点，跳过方向分类
+        band_result, _ = engine(band_img, use_cls=False)
+        for box, text, _ in band_result or []:
+            probe_result.append(([[x / scale, y / scale + top] for x, y in box], text))
+    return probe_result
+
+
+def _find_crop_range(probe_result, channel, height):
+    """根据锚点文本确定持仓区域的纵向范围，返回 (top, bottom)，找不到锚点的一侧不裁剪"""
+    if channel == 'auto':
+        channel = detect_channel([text for _, text in probe_result])
+    anchors = CROP_ANCHORS.get(channel)
+    if not anchors:
+        return 0, height
+
+    margin = PREPROCESS_CONFIG['margin']
+    top_ys = [min(y for _, y in box) for box, text in probe_result
+              if any(anchor in text for anchor in anchors['top'])]
+    bottom_ys = [max(y for _, y in box) for box, text in probe_result
+                 if any(anchor in text for anchor in anchors['bottom'])]
+
+    top = max(0, int(min(top_ys)) - margin) if top_ys else 0
+    bottom = min(height, int(max(bottom_ys)) + margin) if bottom_ys else height
+    if bottom <= top:
+        return 0, height
+    return top, bottom
+
+
+def preprocess_image(image_path, channel='auto'):
+    """
+    OCR前的预处理：灰度化、裁剪到持仓区域、按目标文字高度缩小
+
+    返回:
+        (预处理后的PIL图片, 裁剪的纵向偏移, 缩放比例)，
+        识别结果按 x / scale, y / scale + offset 映射回原图坐标
+    """
+    from PIL import Image
+
+    start = time.perf_counter()
+    with Image.open(image_path) as img:
+        gray = img.convert('L')
+    width, height = gray.size
+
+    probe_result = _probe_image(gray, get_engine('normal'), channel)
+    top, bottom = _find_crop_range(probe_result, channel, height)
+    if (top, bottom) != (0, height):
+        gray = gray.crop((0, top, width, bottom))
+
+    # 用粗识别得到的文字高度中位数估计缩放比例
+    scale = 1.0
+    text_heights = sorted(max(y for _, y in box) - min(y for _, y in box) for box, _ in probe_result)
+    if text_heights:
+        median_height = text_heights[len(text_heights) // 2]
+        if median_height > 0:
+            scale = min(1.0, PREPROCESS_CONFIG['target_text_height'] / median_height)
+    if scale < 0.95:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))))
+    else:
+        scale = 1.0
+
+    kept = gray.width * gray.height / (width * height)
+    print(f"预处理: 裁剪范围 {top}-{bottom}, 缩放比例 {scale:.2f}, 保留 {kept:.0%} 像素, "
+          f"耗时 {time.perf_counter() - start:.2f}秒")
+    return gray, top, scale
+
+
+def parse_ocr_result(ocr_result, channel='auto', image_path=''):
+    """根据渠道解析OCR原始结果，返回 (渠道, 解析数据)，无法确定渠道时返回 (None, [])"""
+    text_lines = [x[1] for x in ocr_result]
+
+    # 自动检测渠道
+    if channel == 'auto':
+        with span('detect_channel'):
+            detection = detect_channel_scores(text_lines)
+        detected_channel = detection['channel']
+        if not detected_channel:
+            print(f"无法确定图片 {image_path} 的渠道")
+            return None, []
+        if detection['fallback']:
+            print(f"检测到渠道: {detected_channel} (兜底规则)")
         else:
-            print(f"使用普通模式进行OCR (尺寸: {width}x{height})")
-            engine = RapidOCR()
-        
-        # OCR识别
-        ocr_result, _ = engine(image_path)
-        if not ocr_result:
-            print(f"图片 {image_path} OCR识别失败或无文本")
-            return None, None
-        
-        text_lines = [x[1] for x in ocr_result]
-        
-        # 自动检测渠道
-        if channel == 'auto':
-            detected_channel = detect_channel(text_lines)
-            if not detected_channel:
-                print(f"无法确定图片 {image_path} 的渠道")
-                return None, None
-            channel = detected_channel
-        
-        # 根据渠道解析数据
+            features = ', '.join(detection['matched'][detected_channel])
+            print(f"检测到渠道: {detected_channel} (置信度 {detection['confidence']:.2f}, 命中特征: {features})")
+        channel = detected_channel
+
+    # 根据渠道解析数据
+    with span('parse', channel=channel) as parse_span:
         if channel == 'huabao':
+            from parsers.huabao import parse_huabao_stock_data
             parsed_data = parse_huabao_stock_data(text_lines)
         elif channel == 'haitong':
+            from parsers.haitong import parse_haitong_stock_data
             parsed_data = parse_haitong_stock_data(ocr_result)
         else:  # channel == 'fund_e'
+            from parsers.fund_e import parse_fund_data
             parsed_data = parse_fund_data(text_lines)
+        parse_span.set(records=len(parsed_data))
+
+    return channel, parsed_data
+
+
+def process_image(image_path, channel='auto', cache=None, tile=True, preprocess=False):
+    """
+    处理单个图片
+
+    参数:
+        image_path: 图片路径
+        channel: 渠道类型
+        cache: OCRCache实例，命中时跳过OCR推理（以及相同渠道参数下的解析）
+        tile: 竖长大图是否使用分块识别，为False时使用整图大图片模式
+        preprocess: 是否在OCR前做灰度化、裁剪和缩小预处理
+
+    返回:
+        (渠道, 解析数据)；图片已识别但没有文本或无法确定渠道时解析数据为空列表，处理出错时为None
+    """
+    from PIL import Image
+
+    try:
+        # 检查图片尺寸
+        with Image.open(image_path) as img:
+            width, height = img.size
         
-        return channel, parsed_data
+        # 仅根据图片尺寸决定OCR引擎配置
+        mode = select_engine_mode(width, height, tile)
+        config = engine_config(mode)
+        if preprocess:
+            config['preprocess'] = PREPROCESS_CONFIG
+
+        # 查询OCR缓存
+        entry = None
+        if cache is not None:
+            cache_key = cache.make_key(cache.file_hash(image_path), config)
+            entry = cache.get(cache_key)
+            # 解析器更新后，旧的解析结果作废，只复用原始OCR结果重新解析
+            if entry is not None and entry.get('parser_version') != PARSER_VERSION:
+                entry['parser_version'], entry['parsed'] = PARSER_VERSION, {}
+            if entry is not None and channel in entry['parsed']:
+                print(f"命中OCR缓存: {os.path.basename(image_path)}")
+                parsed = entry['parsed'][channel]
+                return parsed['channel'], parsed['data']
+
+        if entry is not None:
+            print(f"命中OCR缓存（仅原始结果）: {os.path.basename(image_path)}")
+            ocr_result = entry['ocr_result']
+        else:
+            image, offset_y, scale = image_path, 0, 1.0
+            if preprocess:
+                with span('ocr.preprocess', image=os.path.basename(image_path)):
+                    image, offset_y, scale = preprocess_image(image_path, channel)
+                width, height = image.size
+                mode = select_engine_mode(width, height, tile)
+
+            if mode == 'tiled':
+                print(f"使用分块模式进行OCR (尺寸: {width}x{height})")
+            elif mode == 'large':
+                print(f"使用大图片模式进行OCR (尺寸: {width}x{height})")
+            else:
+                print(f"使用普通模式进行OCR (尺寸: {width}x{height})")
+            ocr_result = run_ocr(image, mode, os.path.basename(image_path))
+
+            # 预处理后的坐标映射回原图
+            if preprocess:
+                ocr_result = [[[[x / scale, y / scale + offset_y] for x, y in box], text, score]
+                              for box, text, score in ocr_result]
+            entry = {'engine_config': config, 'parser_version': PARSER_VERSION, 'ocr_result': ocr_result, 'parsed': {}}
+
+        if not ocr_result:
+            print(f"图片 {image_path} OCR识别失败或无文本")
+            detected_channel, parsed_data = None, []
+        else:
+            detected_channel, parsed_data = parse_ocr_result(ocr_result, channel, image_path)
+
+        if cache is not None:
+            entry['parsed'][channel] = {'channel': detected_channel, 'data': parsed_data}
+            cache.put(cache_key, entry)
+
+        return detected_channel, parsed_data
     except Exception as e:
         print(f"处理图片 {image_path} 时出错: {str(e)}")
         return None, None
 
-def process_images(image_path, batch=False, channel='auto'):
+def _init_worker(threads_per_worker):
+    """工作进程初始化：加载常驻引擎，之后该进程处理的所有图片都复用它"""
+    # fork出的进程继承了父进程的剖析状态，工作进程中不记录（记录无法带回父进程）
+    disable_profiling()
+    # 多个进程同时推理时限制每个进程的线程数，避免CPU超额订阅
+    _engine_options['intra_op_num_threads'] = threads_per_worker
+    reset_ocr_stats()
+    warm_up_engines()
+
+
+def _process_image_task(task):
+    """工作进程中处理单张图片，并带回本次的耗时统计"""
+    img_path, channel, cache, options = task
+    print(f"处理图片: {os.path.basename(img_path)}")
+    detected_channel, parsed_data = process_image(img_path, channel, cache, **options)
+    stats = get_ocr_stats()
+    reset_ocr_stats()
+    return detected_channel, parsed_data, stats
+
+
+def _merge_worker_stats(stats):
+    """把工作进程的耗时统计合并到当前进程"""
+    for mode, seconds in stats['cold_start'].items():
+        key = f"{mode}#{len(_ocr_stats['cold_start']) + 1}"
+        _ocr_stats['cold_start'][key] = seconds
+    _ocr_stats['inference'].extend(stats['inference'])
+
+
+def _iter_batch_results(image_path, image_files, channel, workers=1, cache=None, **options):
     """
-    API函数：处理图像并返回结果数据
-    
-    参数:
-        image_path: 图片路径或文件夹
-        batch: 是否批量处理
-        channel: 渠道类型
-        
-    返回:
-        解析后的投资组合数据
+    逐张处理图片，按image_files的顺序产出 (文件名, 渠道, 解析数据)
+
+    workers大于1时使用进程池，每个工作进程持有自己的常驻引擎，
+    从任务队列中逐张领取图片；结果仍按原顺序返回，保证输出确定。
     """
-    # 创建统一的返回结果结构
-    result = {
+    if workers <= 1:
+        for img_file in image_files:
+            print(f"处理图片: {img_file}")
+            with span('image', image=img_file):
+                detected_channel, parsed_data = process_image(os.path.join(image_path, img_file), channel, cache,
+                                                              **options)
+            yield img_file, detected_channel, parsed_data
+        return
+
+    tasks = [(os.path.join(image_path, img_file), channel, cache, options) for img_file in image_files]
+    workers = min(workers, len(tasks))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(threads_per_worker,)) as executor:
+        for img_file, (detected_channel, parsed_data, stats) in zip(
+                image_files, executor.map(_process_image_task, tasks)):
+            _merge_worker_stats(stats)
+            yield img_file, detected_channel, parsed_data
+
+
+def iter_process_images(image_path, batch=False, channel='auto', workers=1, cache_dir=None, cache_size_mb=256,
+                        tile=True, preprocess=False, files=None):
+    """
+    流式处理图像：每处理完一张图片就产出 (文件名, 渠道, 解析数据)，下游无需等待全部图片完成
+
+    参数与process_images相同；files为批量模式下只处理的文件名（例如增量构建时改动过的图片），
+    没有识别出文本或渠道无法确定的图片产出 (文件名, None, [])，处理出错的图片产出 (文件名, None, None)
+    """
+    # 检查图片路径是否存在
+    if not os.path.exists(image_path):
+        print(f"错误: 路径不存在 {image_path}")
+        return
+
+    # 每次运行单独统计耗时，已加载的引擎继续复用
+    reset_ocr_stats()
+
+    cache = OCRCache(cache_dir, cache_size_mb) if cache_dir else None
+    try:
+        # 处理批量模式
+        if batch or os.path.isdir(image_path):
+            if not os.path.isdir(image_path):
+                print(f"错误: 批量处理需要指定文件夹路径")
+                return
+
+            # 按文件名排序，保证串行和并行模式的输出顺序一致
+            image_files = sorted(f for f in os.listdir(image_path)
+                                 if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')))
+            if files is not None:
+                wanted = set(files)
+                image_files = [f for f in image_files if f in wanted]
+
+            if not image_files:
+                print(f"文件夹 {image_path} 中没有找到图片文件")
+                return
+
+            if workers > 1:
+                print(f"开始批量处理 {len(image_files)} 张图片 (并行进程数: {workers})...")
+            else:
+                print(f"开始批量处理 {len(image_files)} 张图片...")
+
+            yield from _iter_batch_results(image_path, image_files, channel, workers, cache,
+                                           tile=tile, preprocess=preprocess)
+
+        # 单文件处理模式
+        else:
+            print(f"处理图片: {image_path}")
+            with span('image', image=os.path.basename(image_path)):
+                detected_channel, parsed_data = process_image(image_path, channel, cache, tile, preprocess)
+            yield os.path.basename(image_path), detected_channel, parsed_data
+    finally:
+        if cache is not None:
+            cache.evict()
+
+
+def new_result():
+    """创建统一的返回结果结构"""
+    return {
         'data': [],  # 统一数据存储键
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'sources': [],
@@ -134,79 +664,71 @@ def process_images(image_path, batch=False, channel='auto'):
             'total_count': 0
         }
     }
+
+
+def append_image_result(result, file_name, detected_channel, parsed_data):
+    """把一张图片的解析数据加入结果，为每条数据添加来源标识；没有数据时返回False"""
+    if not (detected_channel and parsed_data):
+        return False
+    for item in parsed_data:
+        item['source_type'] = detected_channel
+        result['data'].append(item)
+    result['sources'].append(file_name)
+    return True
+
+
+def process_images(image_path, batch=False, channel='auto', workers=1, cache_dir=None, cache_size_mb=256,
+                   tile=True, preprocess=False, stitch=True):
+    """
+    API函数：处理图像并返回结果数据
     
-    # 检查图片路径是否存在
-    if not os.path.exists(image_path):
-        print(f"错误: 路径不存在 {image_path}")
-        return result
-    
-    # 存储原始channel参数
-    original_channel = channel
-    
-    # 处理批量模式
-    if batch or os.path.isdir(image_path):
-        if not os.path.isdir(image_path):
-            print(f"错误: 批量处理需要指定文件夹路径")
-            return result
-        
-        image_files = [f for f in os.listdir(image_path) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-        
-        if not image_files:
-            print(f"文件夹 {image_path} 中没有找到图片文件")
-            return result
-        
-        print(f"开始批量处理 {len(image_files)} 张图片...")
+    参数:
+        image_path: 图片路径或文件夹
+        batch: 是否批量处理
+        channel: 渠道类型
+        workers: 批量处理时的并行进程数，1表示串行处理
+        cache_dir: 单张图片OCR缓存目录，为None时不使用缓存
+        cache_size_mb: OCR缓存的大小上限（MB）
+        tile: 竖长大图是否使用分块识别
+        preprocess: 是否在OCR前做灰度化、裁剪和缩小预处理
+        stitch: 是否去掉多张截图之间重叠（重复解析）的记录
         
-        for img_file in image_files:
-            img_path = os.path.join(image_path, img_file)
-            print(f"处理图片: {img_file}")
-            
-            # 使用不同的变量名接收返回值
-            detected_channel, parsed_data = process_image(img_path, original_channel)
-            
-            if detected_channel and parsed_data:
-                # 为每条数据添加来源标识并添加到统一数据中
-                for item in parsed_data:
-                    item['source_type'] = detected_channel
-                    result['data'].append(item)
-                result['sources'].append(img_file)
+    返回:
+        解析后的投资组合数据
+    """
+    result = new_result()
+    is_batch = batch or os.path.isdir(image_path)
+    processed = 0
+
+    image_results = iter_process_images(image_path, batch, channel, workers, cache_dir, cache_size_mb, tile, preprocess)
+    if stitch:
+        image_results = iter_stitched(image_results)
+
+    for file_name, detected_channel, parsed_data in image_results:
+        processed += 1
+        if append_image_result(result, file_name, detected_channel, parsed_data):
+            if is_batch:
                 print(f"  - 解析了 {len(parsed_data)} 条{detected_channel}数据")
             else:
-                print(f"  - 跳过 {img_file}")
-        
-        # 动态生成汇总信息
-        generate_summary(result)
-        
+                print(f"成功解析 {len(parsed_data)} 条{detected_channel}数据")
+        elif is_batch:
+            print(f"  - 跳过 {file_name}")
+        else:
+            print("处理失败")
+
+    # 动态生成汇总信息
+    generate_summary(result)
+
+    if is_batch and processed:
         print(f"\n批量处理完成:")
+        print_ocr_stats()
         for source_type, count in result['summary'].items():
             if source_type != 'total_count':
                 print(f"- {source_type}数据: {count} 条")
-        
-        return result
-    
-    # 单文件处理模式
-    else:
-        print(f"处理图片: {image_path}")
-        detected_channel, parsed_data = process_image(image_path, original_channel)
-        
-        if detected_channel and parsed_data:
-            file_name = os.path.basename(image_path)
-            # 为每条数据添加来源标识并添加到统一数据中
-            for item in parsed_data:
-                item['source_type'] = detected_channel
-                result['data'].append(item)
-            result['sources'].append(file_name)
-            
-            # 动态生成汇总信息
-            generate_summary(result)
-            
-            print(f"成功解析 {len(parsed_data)} 条{detected_channel}数据")
-            
-            return result
-        else:
-            print("处理失败")
-            return result
+    elif result['data']:
+        print_ocr_stats()
+
+    return result
 
 def generate_summary(result):
     """根据data动态生成汇总信息"""
@@ -233,15 +755,30 @@ def main(args=None):
         parser.add_argument('--image', required=True, help='图片路径或包含多张图片的文件夹')
         parser.add_argument('--output', help='输出JSON文件路径')
         parser.add_argument('--batch', action='store_true', help='批量处理文件夹中的图片')
+        parser.add_argument('--workers', type=int, default=1, help='批量处理时的并行进程数，默认1（串行）')
+        parser.add_argument('--cache_dir', '--cache-dir', dest='cache_dir',
+                            help='单张图片OCR缓存目录，只对新增或改动过的图片重新识别')
+        parser.add_argument('--cache_size', type=float, default=256, help='OCR缓存大小上限（MB），默认256')
+        parser.add_argument('--no_tile', action='store_true', help='竖长大图不分块，整图使用大图片模式识别')
+        parser.add_argument('--preprocess', action='store_true', help='OCR前灰度化、裁剪到持仓区域并缩小图片')
+        parser.add_argument('--no_stitch', action='store_true', help='不去除多张截图之间重叠的记录')
+        add_profile_arguments(parser)
         
         args = parser.parse_args()
     
     # 调用API函数
-    result = process_images(
-        image_path=args.image,
-        batch=args.batch,
-        channel=args.channel
-    )
+    with profile_session(args):
+        result = process_images(
+            image_path=args.image,
+            batch=args.batch,
+            channel=args.channel,
+            workers=getattr(args, 'workers', 1),
+            cache_dir=getattr(args, 'cache_dir', None),
+            cache_size_mb=getattr(args, 'cache_size', 256),
+            tile=not getattr(args, 'no_tile', False),
+            preprocess=getattr(args, 'preprocess', False),
+            stitch=not getattr(args, 'no_stitch', False)
+        )
     
     return result
 
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+
+from atomic_write import atomic_write
+
+
+class OCRCache:
+    """
+    按图片内容哈希缓存OCR结果
+
+    缓存键由图片文件内容的SHA-256和OCR引擎配置共同决定，图片改动或引擎配置变化都会失效。
+    每个缓存条目保存RapidOCR原始结果（文本框、文本、置信度）以及各渠道参数下的解析结果，
+    解析结果带有解析器版本，版本变化时只复用原始结果重新解析；
+    总大小超过上限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, cache_dir, max_size_mb=256):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_hash(path):
+        """计算文件内容的SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(image_hash, engine_config):
+        """由图片哈希和引擎配置生成缓存键"""
+        config = json.dumps(engine_config, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{image_hash}:{config}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """读取缓存条目，不存在或已损坏时返回None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 更新访问时间，供淘汰时判断最近使用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        """写入缓存条目（先写临时文件再替换，多进程同时写入也不会读到半个文件）"""
+        with atomic_write(self._entry_path(key)) as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+    def evict(self):
+        """缓存总大小超过上限时，从最久未使用的条目开始删除，返回删除的条目数"""
+        entries = []
+        total_size = 0
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+        return removed
@@ -0,0 +1,3 @@
+# 解析器版本：任何解析器的输出发生变化（修复解析错误、增减字段）时加1，
+# 使OCR缓存和增量构建清单中按旧解析器保存的解析结果失效
+PARSER_VERSION = 1
@@ -2,10 +2,79 @@ import re
 
 from models import InvestmentInfo
 
+# 每行的类型
+_TEXT, _CODE, _EMPTY, _NUMBER, _SHARES, _NAV, _ASSET = range(7)
+# 基金的字段名称行
+FIELD_HEADERS = {'持有份额': _SHARES, '参考净值': _NAV, '资产情况': _ASSET}
+# 一条基金记录的锚点：持有份额、参考净值、资产情况连续三行，接着三行数值
+_RECORD_ANCHOR = bytes([_SHARES, _NAV, _ASSET, _NUMBER, _NUMBER, _NUMBER])
+# 由类型数组转换出的标记数组（1为命中），配合rfind找出某行之前最后一个非空行、数值或字段名称行、"资产情况"行
+_NONEMPTY_MARKS = bytes(0 if kind == _EMPTY else 1 for kind in range(256))
+_STOP_MARKS = bytes(1 if kind in (_NUMBER, _SHARES, _NAV, _ASSET) else 0 for kind in range(256))
+_ASSET_MARKS = bytes(1 if kind == _ASSET else 0 for kind in range(256))
+
+_NUMBER_PATTERN = re.compile(r'^[\d,\.]+$')
+_CODE_PATTERN = re.compile(r'[（\(](\d{6})[）\)]')
+# 基金名称的清理规则
+_PAGE_HEADER_PATTERN = re.compile(r'.*筛选\s*')
+_DATA_DATE_PATTERN = re.compile(r'.*数据日期[：:][^，。]*')
+_SPACE_PATTERN = re.compile(r'\s+')
+_LIANJIE_PATTERN = re.compile(r'联\s+接')
+_TOUZI_PATTERN = re.compile(r'投\s+资')
+
+
+def _index_lines(stripped):
+    """对每行只判断一次类型，返回 (类型数组, 含代码行的代码匹配结果)"""
+    kinds = bytearray(len(stripped))
+    code_matches = {}
+    for idx, line in enumerate(stripped):
+        kind = FIELD_HEADERS.get(line)
+        if kind is None:
+            if not line:
+                kind = _EMPTY
+            elif _NUMBER_PATTERN.match(line):
+                kind = _NUMBER
+            else:
+                code_match = ('(' in line or '（' in line) and _CODE_PATTERN.search(line)
+                if code_match:
+                    kind = _CODE
+                    code_matches[idx] = code_match
+                else:
+                    kind = _TEXT
+        kinds[idx] = kind
+    return kinds, code_matches
+
+
+def _clean_fund_name(fund_name):
+    """清理基金名称（名称中不含对应文字时跳过该条规则）"""
+    # 清理基金名称中可能存在的页面头部信息
+    if '筛选' in fund_name:
+        fund_name = _PAGE_HEADER_PATTERN.sub('', fund_name)
+    if '数据日期' in fund_name:
+        fund_name = _DATA_DATE_PATTERN.sub('', fund_name)
+    fund_name = _SPACE_PATTERN.sub('', fund_name).replace('(', '（')
+
+    # 修复基金名称中的常见问题
+    if '联' in fund_name:
+        fund_name = _LIANJIE_PATTERN.sub('联接', fund_name)
+    if '投' in fund_name:
+        fund_name = _TOUZI_PATTERN.sub('投资', fund_name)
+    return fund_name
+
 
 def parse_fund_data(lines):
-    """解析基金e账户的OCR文本"""
+    """
+    解析基金e账户的OCR文本
+
+    每行先分类一次（数值、字段名称、含基金代码、普通文本、空行），由类型数组直接找出每条记录的锚点，
+    基金名称取锚点之前、上一个数值或字段名称行之后的文本行
+    """
     results = []
+    stripped = [line.strip() for line in lines]
+    kinds, code_matches = _index_lines(stripped)
+    nonempty = kinds.translate(_NONEMPTY_MARKS)
+    stops = kinds.translate(_STOP_MARKS)
+    assets = kinds.translate(_ASSET_MARKS)
 
     # 找到筛选之后的起始位置
     start_idx = 0
@@ -14,96 +83,65 @@ def parse_fund_data(lines):
             start_idx = idx + 1
             break
 
-    # 从筛选之后开始处理
-    i = start_idx
-
-    while i < len(lines):
-        # 寻找标准模式的开始（持有份额、参考净值、资产情况连续三行）
-        if (i+2 < len(lines) and
-                lines[i].strip() == '持有份额' and
-                lines[i+1].strip() == '参考净值' and
-                lines[i+2].strip() == '资产情况'):
-
-            # 确认接下来的三行是否为数值
-            if i+5 < len(lines) and all(re.match(r'^[\d,\.]+$', lines[i+3+k].strip()) for k in range(3)):
-                try:
-                    # 提取数值部分
-                    holding = float(lines[i+3].strip().replace(',', ''))
-                    nav = float(lines[i+4].strip().replace(',', ''))
-                    asset = float(lines[i+5].strip().replace(',', ''))
-
-                    # 向上查找基金名称和代码
-                    j = i - 1
-                    name_parts = []
-                    fund_code = ""
-
-                    # 跳过可能的空行
-                    while j >= 0 and not lines[j].strip():
-                        j -= 1
-
-                    # 检查上一行是否是数值（上一个基金的资产情况）
-                    if j >= 0 and re.match(r'^[\d,\.]+$', lines[j].strip()):
-                        # 继续向上查找，直到找到"资产情况"行
-                        asset_line_found = False
-                        for k in range(j-1, max(0, j-5), -1):
-                            if k >= 0 and lines[k].strip() == '资产情况':
-                                j = k - 1  # 从"资产情况"行的上一行开始查找
-                                asset_line_found = True
-                                break
-
-                        if not asset_line_found:
-                            j -= 3  # 如果找不到"资产情况"行，假设上一个基金占用了3行数据
-
-                    # 收集基金名称，直到找到上一个基金的资产情况数值
-                    while j >= 0:
-                        line = lines[j].strip()
-
-                        # 如果遇到数值行或标准的字段名称，停止收集
-                        if (re.match(r'^[\d,\.]+$', line) or
-                                line in ['持有份额', '参考净值', '资产情况']):
-                            break
-
-                        # 查找基金代码
-                        code_match = re.search(r'[（\(](\d{6})[）\)]', line)
-                        if code_match and not fund_code:
-                            fund_code = code_match.group(1)
-
-                            # 获取代码前的文本作为名称的一部分
-                            prefix = line[:code_match.start()].strip()
-                            if prefix:
-                                name_parts.insert(0, prefix)
-                        elif line:  # 如果行不为空
-                            name_parts.insert(0, line)
-
-                        j -= 1
-
-                    # 组合并清理基金名称
-                    fund_name = ' '.join(name_parts).strip()
-
-                    # 清理基金名称中可能存在的页面头部信息
-                    fund_name = re.sub(r'.*筛选\s*', '', fund_name)
-                    fund_name = re.sub(r'.*数据日期[：:][^，。]*', '', fund_name)
-                    fund_name = re.sub(r'\s+', '', fund_name).replace('(', '（')
-
-                    # 修复基金名称中的常见问题
-                    fund_name = re.sub(r'联\s+接', '联接', fund_name)
-                    fund_name = re.sub(r'投\s+资', '投资', fund_name)
-
-                    # 创建统一的投资信息对象
-                    investment = InvestmentInfo()
-                    investment.name = fund_name
-                    investment.code = fund_code
-                    investment.quantity = holding
-                    investment.current_price = nav
-                    investment.market_value = asset
-                    results.append(investment.to_dict())
-
-                    # 跳过已处理的行
-                    i += 6
-                    continue
-                except ValueError:
-                    pass
-
-        i += 1
-
-    return results
\ No newline at end of file
+    # 从筛选之后开始查找记录锚点
+    i = kinds.find(_RECORD_ANCHOR, start_idx)
+    while i != -1:
+        try:
+            # 提取数值部分
+            holding = float(stripped[i+3].replace(',', ''))
+            nav = float(stripped[i+4].replace(',', ''))
+            asset = float(stripped[i+5].replace(',', ''))
+        except ValueError:
+            i = kinds.find(_RECORD_ANCHOR, i + 1)
+            continue
+
+        # 名称区域的末尾：锚点前最后一个非空行
+        j = nonempty.rfind(1, 0, i)
+
+        # 上一行是数值（上一个基金的资产情况）时，跳到上一个基金的"资产情况"行之前，
+        # 只在前4行内查找，找不到时假设上一个基金占用了3行数据
+        if j >= 0 and kinds[j] == _NUMBER:
+            k = assets.rfind(1, 0, j)
+            j = k - 1 if k > max(0, j - 5) else j - 3
+
+        # 名称区域：上一个数值或字段名称行之后到j为止的文本行；
+        # 区域内最后一个含代码的行提供基金代码，只取代码前的文本作为名称的一部分
+        name_lines = []
+        code_position = None
+        if j >= 0:
+            for idx in range(stops.rfind(1, 0, j + 1) + 1, j + 1):
+                kind = kinds[idx]
+                if kind == _CODE:
+                    code_position = len(name_lines)
+                    name_lines.append(idx)
+                elif kind == _TEXT:
+                    name_lines.append(idx)
+
+        fund_code = ""
+        name_parts = []
+        for position, idx in enumerate(name_lines):
+            if position == code_position:
+                code_match = code_matches[idx]
+                fund_code = code_match.group(1)
+                prefix = stripped[idx][:code_match.start()].strip()
+                if prefix:
+                    name_parts.append(prefix)
+            else:
+                name_parts.append(stripped[idx])
+
+        # 组合并清理基金名称
+        fund_name = _clean_fund_name(' '.join(name_parts).strip())
+
+        # 创建统一的投资信息对象
+        investment = InvestmentInfo()
+        investment.name = fund_name
+        investment.code = fund_code
+        investment.quantity = holding
+        investment.current_price = nav
+        investment.market_value = asset
+        results.append(investment.to_dict())
+
+        # 跳过已处理的行
+        i = kinds.find(_RECORD_ANCHOR, i + 6)
+
+    return results
@@ -1,5 +1,61 @@
+import re
+from bisect import bisect_right
+from itertools import chain
+
+import numpy as np
+
 from models import InvestmentInfo
 
+# 标题和导航栏中的文字，包含任一关键词的文本框不参与解析
+SKIP_KEYWORDS = ["总资产", "股票/市值", "持仓/可用", "下滑查看", "当前持仓",
+                 "查看盈亏", "以上是全部", "当日预估", "浮动盈亏", "股票", "理财"]
+_SKIP_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in SKIP_KEYWORDS))
+_CJK_PATTERN = re.compile('[\u4e00-\u9fff]')
+
+
+def _column_mean(values):
+    """按列依次累加后求平均，每行的结果与 sum(row) / len(row) 相同"""
+    total = values[:, 0].copy()
+    for k in range(1, values.shape[1]):
+        total += values[:, k]
+    return total / values.shape[1]
+
+
+def _classify_cell(temp_data, text, section):
+    """根据文本框所在的水平区域和内容特征，判断数据类型并记入当前股票的数据"""
+    # 第一区域 (左侧) - 股票名称或市值
+    if section == 0:
+        if _CJK_PATTERN.search(text):  # 包含中文字符
+            temp_data['name'] = text
+        elif '.' in text and text.replace('.', '').replace('-', '').isdigit():  # 数字+小数点
+            temp_data['market_value'] = text
+
+    # 第二区域 (中左) - 持仓数量
+    elif section == 1:
+        if text.replace(',', '').isdigit():  # 纯数字
+            temp_data['shares'] = text
+
+    # 第三区域 (中右) - 市价和成本价
+    elif section == 2:
+        if '.' in text:
+            # 根据y位置来区分市价和成本价
+            if 'price' not in temp_data:
+                temp_data['price'] = text  # 市价
+            else:
+                temp_data['cost_price'] = text  # 成本价
+
+    # 第四区域 (右侧) - 盈亏
+    else:
+        # 盈亏金额通常是数字加小数点，可能有正负号
+        if '.' in text and '%' not in text:
+            # 检查是否是数字（可能有正负号）
+            number_text = text.replace('.', '').replace('-', '').replace('+', '')
+            if number_text.isdigit():
+                temp_data['profit_amount'] = text  # 盈亏金额
+        # 盈亏比例通常带有百分号，如 -4.67%
+        elif '%' in text:
+            temp_data['profit_rate'] = text  # 盈亏比例
+
 
 def parse_haitong_stock_data(ocr_results):
     """
@@ -15,29 +71,35 @@ def parse_haitong_stock_data(ocr_results):
     if not ocr_results:
         return []
 
+    # 所有文本框一次性转为 (N, 4, 2) 数组，边界、中心点、高度都按列计算
+    texts = [item[1] for item in ocr_results]
+    coords = chain.from_iterable(chain.from_iterable(item[0] for item in ocr_results))
+    boxes = np.fromiter(coords, dtype=np.float64).reshape(len(ocr_results), -1, 2)
+    xs, ys = boxes[:, :, 0], boxes[:, :, 1]
+    box_top, box_bottom = ys.min(axis=1), ys.max(axis=1)
+    # 中心点按顶点顺序逐个累加再求平均（与sum(...)/len(...)的浮点结果一致）
+    center_x = _column_mean(xs)
+    center_y = _column_mean(ys)
+
     # 计算图像边界
-    min_x = min(min(coord[0] for coord in item[0]) for item in ocr_results)
-    max_x = max(max(coord[0] for coord in item[0]) for item in ocr_results)
-    min_y = min(min(coord[1] for coord in item[0]) for item in ocr_results)
-    max_y = max(max(coord[1] for coord in item[0]) for item in ocr_results)
+    min_x, max_x = xs.min(), xs.max()
+    min_y, max_y = box_top.min(), box_bottom.max()
 
     image_width = max_x - min_x
     image_height = max_y - min_y
 
     # 第二步：过滤掉非股票相关的OCR结果
-    filtered_results = []
     stock_area_detected = False
     stock_area_top = 0
     stock_area_bottom = max_y
 
     # 找出股票区域的开始和结束位置
-    for item in ocr_results:
-        coords, text, confidence = item
+    for index, text in enumerate(texts):
         if "当前持仓" in text or "股票/市值" in text:
-            stock_area_top = max(stock_area_top, max(coord[1] for coord in coords))
+            stock_area_top = max(stock_area_top, box_bottom[index])
             stock_area_detected = True
         elif "以上是全部" in text and stock_area_detected:
-            stock_area_bottom = min(coord[1] for coord in coords)
+            stock_area_bottom = box_top[index]
             break
 
     # 如果没有找到明确的股票区域，使用图像的中间区域作为估计
@@ -45,91 +107,52 @@ def parse_haitong_stock_data(ocr_results):
         stock_area_top = min_y + image_height * 0.3  # 大约从图像30%高度开始
         stock_area_bottom = min_y + image_height * 0.9  # 到图像90%高度结束
 
-    # 过滤位于股票区域的结果
-    for item in ocr_results:
-        coords, text, confidence = item
-        # 获取中心点y坐标
-        center_y = sum(coord[1] for coord in coords) / len(coords)
+    # 排除明显的标题和导航栏，只保留位于股票列表区域的结果
+    keep = (center_y >= stock_area_top) & (center_y <= stock_area_bottom)
+    keep &= np.fromiter((_SKIP_PATTERN.search(text) is None for text in texts), dtype=bool, count=len(texts))
 
-        # 排除明显的标题和导航栏
-        skip_keywords = ["总资产", "股票/市值", "持仓/可用", "下滑查看", "当前持仓",
-                         "查看盈亏", "以上是全部", "当日预估", "浮动盈亏", "股票", "理财"]
-        if any(keyword in text for keyword in skip_keywords):
-            continue
-
-        # 只保留位于股票列表区域的结果
-        if stock_area_top <= center_y <= stock_area_bottom:
-            filtered_results.append(item)
-
-    # 第三步：按照y坐标排序
-    filtered_results.sort(key=lambda x: sum(coord[1] for coord in x[0]) / len(x[0]))
+    # 第三步：按照y坐标排序（稳定排序，y相同时保持原顺序）
+    kept = np.flatnonzero(keep)
+    order = kept[np.argsort(center_y[kept], kind='stable')]
+    sorted_y = center_y[order]
 
     # 第四步：根据数据特征和相对位置进行分类
     stock_data = []
-    current_y_center = 0
 
     # 动态计算y阈值 - 根据文本高度的平均值
-    text_heights = [max(coord[1] for coord in item[0]) - min(coord[1] for coord in item[0])
-                    for item in filtered_results]
+    text_heights = (box_bottom[order] - box_top[order]).tolist()
     y_threshold = sum(text_heights) / len(text_heights) * 1.5 if text_heights else 50
 
-    # 计算水平分区 - 将宽度分为几个区域
-    x_sections = [
-        min_x + image_width * 0.25,  # 大约25%宽度位置
-        min_x + image_width * 0.5,   # 大约50%宽度位置
-        min_x + image_width * 0.75   # 大约75%宽度位置
-    ]
-
-    temp_data = {}
-
-    for item in filtered_results:
-        coords, text, confidence = item
-        # 计算文本框中心点
-        center_x = sum(coord[0] for coord in coords) / len(coords)
-        center_y = sum(coord[1] for coord in coords) / len(coords)
-
-        # 如果y坐标差距大于阈值，认为是新的股票数据开始
-        if abs(center_y - current_y_center) > y_threshold:
-            if temp_data and len(temp_data) > 0:
-                stock_data.append(temp_data)
-                temp_data = {}
-            current_y_center = center_y
-
-        # 根据x坐标的相对位置和内容特征判断数据类型
-        # 第一区域 (左侧) - 股票名称或市值
-        if center_x < x_sections[0]:
-            if any('\u4e00' <= ch <= '\u9fff' for ch in text):  # 包含中文字符
-                temp_data['name'] = text
-            elif '.' in text and text.replace('.', '').replace('-', '').isdigit():  # 数字+小数点
-                temp_data['market_value'] = text
-
-        # 第二区域 (中左) - 持仓数量
-        elif x_sections[0] <= center_x < x_sections[1] and text.replace(',', '').isdigit():  # 纯数字
-            temp_data['shares'] = text
-
-        # 第三区域 (中右) - 市价和成本价
-        elif x_sections[1] <= center_x < x_sections[2] and '.' in text:
-            # 根据y位置来区分市价和成本价
-            if 'price' not in temp_data:
-                temp_data['price'] = text  # 市价
-            else:
-                temp_data['cost_price'] = text  # 成本价
-
-        # 第四区域 (右侧) - 盈亏
-        elif center_x >= x_sections[2]:
-            # 盈亏金额通常是数字加小数点，可能有正负号
-            if '.' in text and '%' not in text:
-                # 检查是否是数字（可能有正负号）
-                number_text = text.replace('.', '').replace('-', '').replace('+', '')
-                if number_text.isdigit():
-                    temp_data['profit_amount'] = text  # 盈亏金额
-            # 盈亏比例通常带有百分号，如 -4.67%
-            elif '%' in text:
-                temp_data['profit_rate'] = text  # 盈亏比例
-
-    # 添加最后一组数据
-    if temp_data and len(temp_data) > 0:
-        stock_data.append(temp_data)
+    # 计算水平分区 - 将宽度分为几个区域（25%、50%、75%宽度位置），
+    # 每个文本框所在的区域序号0-3
+    x_sections = np.array([
+        min_x + image_width * 0.25,
+        min_x + image_width * 0.5,
+        min_x + image_width * 0.75
+    ])
+    sections = np.searchsorted(x_sections, center_x[order], side='right').tolist()
+
+    # 按排序后的y坐标分行：每行从第一个文本框的y开始，y与它相差不超过阈值的文本框属于同一行
+    row_texts = [texts[index] for index in order.tolist()]
+    y_values = sorted_y.tolist()
+    row_y = 0.0
+    start = 0
+    while start < len(y_values):
+        if abs(y_values[start] - row_y) > y_threshold:
+            row_y = y_values[start]
+        end = bisect_right(y_values, row_y + y_threshold, start)
+        # 二分查找的边界按原来的判断条件 |y - 行首y| > 阈值 校正，避免浮点舍入造成的差异
+        while end < len(y_values) and not abs(y_values[end] - row_y) > y_threshold:
+            end += 1
+        while end > start + 1 and abs(y_values[end - 1] - row_y) > y_threshold:
+            end -= 1
+
+        temp_data = {}
+        for position in range(start, end):
+            _classify_cell(temp_data, row_texts[position], sections[position])
+        if temp_data:
+            stock_data.append(temp_data)
+        start = end
 
     # 第五步：整理数据，将分散的信息按股票合并
     organized_stocks = []
@@ -0,0 +1,62 @@
+import time
+
+from models import HoldingsTable
+from ocr import append_image_result
+from profiling import span
+from sunburst.classify import compile_rules
+from sunburst.sunburst import iter_holdings
+
+
+# 流式处理：OCR → 解析 → 分类，每个阶段都是生成器，处理完一张图片就交给下一阶段，
+# 原始OCR结果在解析后即被丢弃，不在内存中累积
+
+def iter_parsed(image_results, result):
+    """
+    解析阶段：逐张图片产出 (文件名, 带来源标识的投资记录列表)
+
+    参数:
+        image_results: ocr.iter_process_images 产出的 (文件名, 渠道, 解析数据)
+        result: ocr.new_result() 创建的结果字典，解析出的记录同时记入其中，供保存OCR结果
+    """
+    for file_name, detected_channel, parsed_data in image_results:
+        if append_image_result(result, file_name, detected_channel, parsed_data):
+            print(f"  - 解析了 {len(parsed_data)} 条{detected_channel}数据")
+            yield file_name, parsed_data
+        else:
+            print(f"  - 跳过 {file_name}")
+
+
+def iter_classified(parsed_batches, record_filter=None, verbose_classify=False, cache=None):
+    """
+    分类阶段：逐批产出 (文件名, 分类后的持仓记录列表)
+
+    参数:
+        parsed_batches: iter_parsed 产出的 (文件名, 投资记录列表)
+        record_filter: 可选的过滤函数，返回False的记录不参与分类
+        verbose_classify: 是否打印详细的分类过程
+        cache: ClassificationCache，默认使用进程内缓存
+    """
+    # 分类规则只编译一次，所有批次共用
+    rule_set = None if verbose_classify else compile_rules()
+    for file_name, records in parsed_batches:
+        if record_filter is not None:
+            records = [item for item in records if record_filter(item)]
+        with span('classify', source=file_name, records=len(records)):
+            holdings = list(iter_holdings(records, verbose_classify, rule_set=rule_set, cache=cache))
+        yield file_name, holdings
+
+
+def collect_holdings(classified_batches):
+    """消费分类阶段的输出，边接收边打印进度和累计市值，返回按列存储全部持仓的HoldingsTable"""
+    holdings = HoldingsTable()
+    total_value = 0.0
+    start = time.perf_counter()
+
+    for index, (file_name, batch) in enumerate(classified_batches, 1):
+        if index == 1:
+            print(f"首批结果耗时: {time.perf_counter() - start:.2f}秒")
+        holdings.extend(batch)
+        total_value += sum(holding['value'] for holding in batch)
+        print(f"[{index}] {file_name}: 新增 {len(batch)} 条持仓，累计 {len(holdings)} 条，累计市值 {total_value:,.2f}")
+
+    return holdings
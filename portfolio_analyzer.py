@@ -1,10 +1,196 @@
 import argparse
 import json
 import os
+from datetime import date
 
-from models import InvestmentInfo
-from ocr import process_images
-from sunburst.sunburst import generate_portfolio_sunburst
+from atomic_write import atomic_write
+from build_manifest import BuildManifest, content_digest, list_images
+from models import HoldingsTable, InvestmentInfo
+from parsers import PARSER_VERSION
+from profiling import add_profile_arguments, profile_session, span
+from stitch import ScreenshotStitcher, iter_stitched
+from sunburst.rules import rules_fingerprint
+
+
+def keep_item(item):
+    """过滤市场价值小于或等于100的项目"""
+    if item.get('market_value') is not None and item['market_value'] <= 100:
+        print(f"过滤市场价值小于或等于100的项目：{item}")
+        return False
+    return True
+
+
+def cash_batch(args):
+    """现金资产作为单独一批记录（未指定现金时返回None）"""
+    if args.cash <= 0:
+        return None
+    cash_item = InvestmentInfo(name=args.cash_name, market_value=args.cash)
+    print(f"已添加现金资产: {args.cash_name} {args.cash}元")
+    return args.cash_name, [cash_item.to_dict()]
+
+
+def save_ocr_result(ocr_result, path):
+    """保存OCR结果到文件"""
+    with span('ocr.save'), atomic_write(path) as f:
+        json.dump(ocr_result, f, ensure_ascii=False, indent=2)
+    print(f"OCR结果已保存至: {path}")
+
+
+def render_outputs(args, holdings):
+    """由分类后的持仓生成旭日图、报告，并按需保存历史快照"""
+    from snapshot_store import SnapshotStore
+    from sunburst.sunburst import generate_portfolio_sunburst, holdings_to_dataframe
+
+    print("正在生成资产配置旭日图...")
+    snapshot_store = SnapshotStore(args.history_db) if args.history_db else None
+    try:
+        with span('render', holdings=len(holdings)):
+            generate_portfolio_sunburst(holdings_to_dataframe(holdings), args.output_html, verbose_classify=False,
+                                       report_files=args.report, plotlyjs=args.plotlyjs,
+                                       plotlyjs_dir=args.plotlyjs_dir, snapshot_store=snapshot_store,
+                                       snapshot_date=args.snapshot_date, snapshot_label=args.image or args.save_ocr)
+    finally:
+        if snapshot_store is not None:
+            snapshot_store.close()
+    print(f"旭日图已生成: {args.output_html}")
+
+
+def run_incremental(args):
+    """
+    增量构建：按清单只对改动过的截图重新OCR、解析，只对解析结果或分类规则变化的截图重新分类，
+    再由各截图已分类的持仓汇总生成输出；输入和输出参数都没有变化时直接跳过生成
+    """
+    if not args.image or not os.path.exists(args.image):
+        print("错误: 增量构建需要指定存在的图片路径或文件夹")
+        return
+
+    manifest = BuildManifest(args.incremental)
+    try:
+        image_dir, image_files = list_images(args.image)
+        ocr_options = {'channel': args.channel, 'tile': not args.no_tile, 'preprocess': args.preprocess,
+                       'parser_version': PARSER_VERSION}
+        changed = manifest.changed_images(image_dir, image_files, ocr_options)
+        print(f"增量构建: 共 {len(image_files)} 张图片，{len(changed)} 张新增或改动")
+
+        # OCR + 解析：只处理改动过的图片
+        if changed:
+            from ocr import iter_process_images, print_ocr_stats
+
+            for file_name, detected_channel, parsed_data in iter_process_images(
+                    args.image, batch=args.batch, channel=args.channel, workers=args.workers,
+                    cache_dir=args.cache_dir, cache_size_mb=args.cache_size, tile=not args.no_tile,
+                    preprocess=args.preprocess, files=changed):
+                if detected_channel and parsed_data:
+                    for item in parsed_data:
+                        item['source_type'] = detected_channel
+                    print(f"  - 解析了 {len(parsed_data)} 条{detected_channel}数据")
+                    manifest.record_parsed(file_name, detected_channel, parsed_data)
+                else:
+                    print(f"  - 跳过 {file_name}")
+                    manifest.record_parsed(file_name, detected_channel, parsed_data)
+            print_ocr_stats()
+
+        # 分类：只处理解析结果新产生或分类规则变化的图片
+        fingerprint = rules_fingerprint()
+        pending = manifest.unclassified(fingerprint)
+        if pending:
+            from pipeline import iter_classified
+            from sunburst.classify import ClassificationCache
+
+            print(f"重新分类 {len(pending)} 张图片的持仓")
+            classify_cache = ClassificationCache(path=args.classify_cache) if args.classify_cache else None
+            batches = ((file_name, manifest.images[file_name]['data']) for file_name in pending)
+            for file_name, holdings in iter_classified(batches, record_filter=keep_item, cache=classify_cache):
+                manifest.record_holdings(file_name, fingerprint, holdings)
+            if classify_cache is not None:
+                classify_cache.save()
+
+        # 汇总输入的指纹：各图片内容、OCR参数、分类规则、现金和输出参数
+        snapshot_date = args.snapshot_date or (date.today().isoformat() if args.history_db else None)
+        digest = content_digest({
+            'images': [[file_name, manifest.images[file_name]['hash']] for file_name in image_files],
+            'ocr_options': ocr_options,
+            'stitch': not args.no_stitch,
+            'rules': fingerprint,
+            'cash': [args.cash, args.cash_name],
+            'outputs': [args.output_html, args.save_ocr, args.report, args.plotlyjs, args.plotlyjs_dir],
+            'history': [args.history_db, snapshot_date],
+        })
+        if manifest.output_current(digest, [args.output_html, args.save_ocr] + args.report):
+            print("截图、分类规则和输出参数都没有变化，跳过生成")
+            return
+
+        from ocr import append_image_result, generate_summary, new_result
+
+        # 由各图片已有的解析、分类结果汇总，解析结果和分类后的持仓分别去掉截图之间重叠的记录
+        ocr_result = new_result()
+        holdings = HoldingsTable()
+        data_stitcher, holdings_stitcher = ScreenshotStitcher(), ScreenshotStitcher()
+        for file_name in image_files:
+            entry = manifest.images[file_name]
+            data, image_holdings = entry['data'], entry['holdings']
+            if not args.no_stitch and entry['channel'] and data:
+                data = data_stitcher.add(file_name, entry['channel'], data)
+                image_holdings = holdings_stitcher.add(file_name, entry['channel'], image_holdings)
+            if append_image_result(ocr_result, file_name, entry['channel'], data):
+                holdings.extend(image_holdings)
+        if data_stitcher.links:
+            print(f"跨截图去重: 共去掉 {data_stitcher.removed} 条重复记录，截图顺序: {' -> '.join(data_stitcher.order())}")
+        generate_summary(ocr_result)
+        save_ocr_result(ocr_result, args.save_ocr)
+
+        if not ocr_result['data']:
+            print("无法生成旭日图: 未提取到有效投资数据")
+            return
+
+        cash = cash_batch(args)
+        if cash is not None:
+            from pipeline import iter_classified
+            # 现金不参与小额市值过滤
+            for _, batch in iter_classified([cash]):
+                holdings.extend(batch)
+
+        render_outputs(args, holdings)
+        manifest.record_output(digest)
+    finally:
+        manifest.save()
+
+
+def run_watch(args):
+    """
+    监听模式：先按增量构建处理一次，然后持续监听图片文件夹，新截图写入（或删除）后自动重新生成；
+    OCR引擎在整个监听期间只加载一次
+    """
+    if not args.image or not os.path.isdir(args.image):
+        print("错误: 监听模式需要指定图片文件夹")
+        return
+
+    from build_manifest import IMAGE_EXTENSIONS
+    from file_watcher import DirectoryWatcher
+    from ocr import warm_up_engines
+
+    # 未指定清单时放在OCR结果文件旁边（不放进监听的文件夹）
+    if not args.incremental:
+        args.incremental = os.path.splitext(args.save_ocr)[0] + '.manifest.json'
+    warm_up_engines()
+
+    def rebuild():
+        """重新生成一次；出错时（例如截图在扫描过程中被删除、过滤后没有持仓）只打印错误，继续监听"""
+        try:
+            run_incremental(args)
+        except Exception as e:
+            print(f"重新生成失败: {type(e).__name__}: {e}")
+
+    with DirectoryWatcher(args.image, IMAGE_EXTENSIONS, debounce=args.watch_debounce) as watcher:
+        rebuild()
+        print(f"\n正在监听 {args.image} ({watcher.backend})，按Ctrl+C退出")
+        try:
+            while True:
+                changed = watcher.wait()
+                print(f"\n检测到 {len(changed)} 个文件变化: {', '.join(sorted(changed))}")
+                rebuild()
+        except KeyboardInterrupt:
+            print("\n已停止监听")
 
 
 def main():
@@ -13,14 +199,52 @@ def main():
     parser.add_argument('--image', help='图片路径或包含多张图片的文件夹')
     parser.add_argument('--output_html', default='portfolio_sunburst.html', help='输出HTML文件路径')
     parser.add_argument('--batch', action='store_true', help='批量处理文件夹中的图片')
+    parser.add_argument('--workers', type=int, default=1, help='批量处理时的并行进程数，默认1（串行）')
+    parser.add_argument('--cache_dir', '--cache-dir', dest='cache_dir',
+                        help='单张图片OCR缓存目录，只对新增或改动过的图片重新识别')
+    parser.add_argument('--cache_size', type=float, default=256, help='OCR缓存大小上限（MB），默认256')
+    parser.add_argument('--no_tile', action='store_true', help='竖长大图不分块，整图使用大图片模式识别')
+    parser.add_argument('--preprocess', action='store_true', help='OCR前灰度化、裁剪到持仓区域并缩小图片')
+    parser.add_argument('--no_stitch', action='store_true',
+                        help='不去除多张截图之间重叠的记录（默认按渠道、代码/名称、数量、市值识别重叠部分）')
     parser.add_argument('--channel', choices=['huabao', 'haitong', 'fund_e', 'auto'],
                         default='auto', help='渠道类型: huabao(华宝证券), haitong(海通证券), fund_e(基金e账户) 或 auto(自动检测)')
     parser.add_argument('--save_ocr', default='ocr_result.json', help='保存OCR结果的JSON文件路径')
     parser.add_argument('--use_saved_ocr', action='store_true', help='使用已保存的OCR结果，不重新处理图像')
     parser.add_argument('--cash', type=float, default=0, help='添加现金资产数额（单位：元）')
     parser.add_argument('--cash_name', default='现金', help='现金资产的名称')
+    parser.add_argument('--report', action='append', default=[],
+                        help='额外保存投资组合报告的文件路径，格式由扩展名决定(json/csv/txt)，可指定多次')
+    parser.add_argument('--plotlyjs', choices=['cdn', 'inline', 'shared'], default='cdn',
+                        help='旭日图引入plotly.js的方式: cdn(需要联网), inline(内嵌到HTML), shared(多个报告共用一份本地文件)')
+    parser.add_argument('--plotlyjs_dir', help='shared模式下存放共用plotly.js的目录，默认与输出HTML同目录')
+    parser.add_argument('--history_db', help='历史快照库(SQLite)路径，每次运行追加一份持仓快照')
+    parser.add_argument('--snapshot_date', help='快照所属日期(YYYY-MM-DD)，默认为当天，补录历史截图时使用')
+    parser.add_argument('--classify_cache', help='分类结果缓存文件路径，规则改动后自动失效')
+    parser.add_argument('--incremental', metavar='MANIFEST',
+                        help='增量构建清单路径：只对改动过的截图重新识别、分类，没有任何变化时跳过生成')
+    parser.add_argument('--watch', action='store_true', help='持续监听图片文件夹，有新截图时自动增量更新输出')
+    parser.add_argument('--watch_debounce', type=float, default=2.0,
+                        help='监听模式下等待连续写入结束的时间（秒），默认2')
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    with profile_session(args):
+        run(args)
+
+
+def run(args):
+    """按命令行参数运行：监听模式、增量构建，或完整处理一次"""
+    if args.watch:
+        run_watch(args)
+        return
+    if args.incremental:
+        run_incremental(args)
+        return
+
+    from ocr import generate_summary, iter_process_images, new_result, print_ocr_stats
+    from pipeline import collect_holdings, iter_classified, iter_parsed
+    from sunburst.classify import ClassificationCache
 
     # 尝试使用保存的OCR结果
     use_saved_ocr = args.use_saved_ocr and os.path.exists(args.save_ocr)
@@ -30,48 +254,60 @@ def main():
         print("错误: 找不到保存的OCR结果文件，且未提供图片路径")
         return
 
-    # 获取OCR结果：从文件加载或处理图像
+    # 获取OCR结果：从文件加载，或流式处理图像（处理完一张图片就立即解析、分类）
     if use_saved_ocr:
         print(f"正在加载保存的OCR结果: {args.save_ocr}")
-        with open(args.save_ocr, 'r', encoding='utf-8') as f:
+        with span('ocr.load_saved'), open(args.save_ocr, 'r', encoding='utf-8') as f:
             ocr_result = json.load(f)
+        parsed_batches = [(args.save_ocr, ocr_result['data'])] if ocr_result and ocr_result.get('data') else []
     else:
         if args.use_saved_ocr and not os.path.exists(args.save_ocr):
             print(f"警告: 找不到保存的OCR结果文件 {args.save_ocr}，将重新进行OCR识别")
 
         # 调用OCR进行图像处理
         print("正在处理图像并提取投资组合数据...")
-        ocr_result = process_images(
+        ocr_result = new_result()
+        image_results = iter_process_images(
             image_path=args.image,
             batch=args.batch,
-            channel=args.channel
+            channel=args.channel,
+            workers=args.workers,
+            cache_dir=args.cache_dir,
+            cache_size_mb=args.cache_size,
+            tile=not args.no_tile,
+            preprocess=args.preprocess
         )
+        if not args.no_stitch:
+            image_results = iter_stitched(image_results)
+        parsed_batches = iter_parsed(image_results, ocr_result)
+
+    classify_cache = ClassificationCache(path=args.classify_cache) if args.classify_cache else None
+
+    def with_cash(batches):
+        """分类各图片的持仓，并在之后追加现金资产（如果有指定）；现金不参与小额市值过滤"""
+        yield from iter_classified(batches, record_filter=keep_item, cache=classify_cache)
+        cash = cash_batch(args) if ocr_result['data'] else None
+        if cash is not None:
+            yield from iter_classified([cash], cache=classify_cache)
+
+    holdings = collect_holdings(with_cash(parsed_batches))
+    if classify_cache is not None:
+        classify_cache.save()
+        print(f"分类缓存: 命中 {classify_cache.hits} 条, 未命中 {classify_cache.misses} 条")
+
+    if not use_saved_ocr:
+        generate_summary(ocr_result)
+        print_ocr_stats()
 
         # 保存OCR结果到文件
-        with open(args.save_ocr, 'w', encoding='utf-8') as f:
-            json.dump(ocr_result, f, ensure_ascii=False, indent=2)
-        print(f"OCR结果已保存至: {args.save_ocr}")
+        save_ocr_result(ocr_result, args.save_ocr)
 
     # 检查是否成功提取数据
-    if not ocr_result or ocr_result['summary']['total_count'] == 0:
+    if not ocr_result or not ocr_result.get('data'):
         print("无法生成旭日图: 未提取到有效投资数据")
         return
 
-    small_value_items = [x for x in ocr_result['data'] if x['market_value'] <= 100]
-    print("过滤市场价值小于或等于100的项目：")
-    for item in small_value_items:
-        print(item)
-    ocr_result['data'] = [x for x in ocr_result['data'] if x['market_value'] > 100]
-
-    # 添加现金资产（如果有指定）
-    if args.cash > 0:
-        cash_item = InvestmentInfo(name=args.cash_name, market_value=args.cash)
-        ocr_result['data'].append(cash_item.to_dict())
-        print(f"已添加现金资产: {args.cash_name} {args.cash}元")
-
-    print("正在生成资产配置旭日图...")
-    generate_portfolio_sunburst(ocr_result, args.output_html, verbose_classify=False)
-    print(f"旭日图已生成: {args.output_html}")
+    render_outputs(args, holdings)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
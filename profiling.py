@@ -0,0 +1,246 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+from atomic_write import atomic_write
+
+# 轻量的性能剖析：在各处理阶段外包一层span，记录耗时和tracemalloc统计的内存峰值（可关闭），
+# 运行结束后输出JSON或Chrome trace格式（chrome://tracing、Perfetto可直接打开）的记录。
+# 未开启时span()直接返回一个什么都不做的共用对象，只多一次全局变量判断
+
+_tracer = None
+
+
+class _NullSpan:
+    """未开启剖析时使用的空span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start', 'memory_start', 'memory_peak', 'parent')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        """给span附加信息（例如解析出的记录数），写入记录的args"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.tracer._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._exit(self)
+        return False
+
+
+class Tracer:
+    """
+    记录span的耗时和内存
+
+    memory为True时开启tracemalloc：每个span记录开始和结束时Python分配的内存，
+    以及span执行期间的内存峰值（嵌套的span各自得到自己区间内的峰值）。
+    tracemalloc只统计Python分配的内存，onnxruntime等原生库的内存不在其中。
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.spans = []
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        if memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, span):
+        stack = self._stack()
+        span.parent = stack[-1] if stack else None
+        if self.memory:
+            current, peak = self._tracemalloc.get_traced_memory()
+            # 进入子span前，把到目前为止的峰值计入所有外层span，再重新开始统计峰值
+            for outer in stack:
+                outer.memory_peak = max(outer.memory_peak, peak)
+            # reset_peak需要Python 3.9，更早的版本中各span的峰值为从开始剖析到该span结束的峰值
+            if hasattr(self._tracemalloc, 'reset_peak'):
+                self._tracemalloc.reset_peak()
+            span.memory_start = current
+            span.memory_peak = current
+        stack.append(span)
+        span.start = time.perf_counter()
+
+    def _exit(self, span):
+        end = time.perf_counter()
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+
+        record = {
+            'name': span.name,
+            'start': span.start - self._origin,
+            'duration': end - span.start,
+            'depth': len(stack),
+            'parent': span.parent.name if span.parent is not None else None,
+            'thread': threading.get_ident(),
+            'args': span.args,
+        }
+        if self.memory:
+            current, peak = self._tracemalloc.get_traced_memory()
+            span.memory_peak = max(span.memory_peak, peak)
+            if span.parent is not None:
+                span.parent.memory_peak = max(span.parent.memory_peak, span.memory_peak)
+            record['memory_start'] = span.memory_start
+            record['memory_end'] = current
+            record['memory_peak'] = span.memory_peak
+        self.spans.append(record)
+
+    def close(self):
+        if self.memory and self._tracemalloc.is_tracing():
+            self._tracemalloc.stop()
+
+    def summary(self):
+        """按名称汇总：次数、总耗时、最长耗时、内存峰值"""
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault(record['name'], {'name': record['name'], 'count': 0, 'total': 0.0,
+                                                       'max': 0.0, 'memory_peak': None})
+            total['count'] += 1
+            total['total'] += record['duration']
+            total['max'] = max(total['max'], record['duration'])
+            if 'memory_peak' in record:
+                total['memory_peak'] = max(total['memory_peak'] or 0, record['memory_peak'])
+        return sorted(totals.values(), key=lambda total: -total['total'])
+
+    def to_json(self):
+        return {'pid': self.pid, 'memory': self.memory, 'spans': self.spans, 'summary': self.summary()}
+
+    def to_chrome_trace(self):
+        """Chrome trace事件格式：每个span为一个完整事件(X)，内存为计数器事件(C)，时间单位为微秒"""
+        events = []
+        for record in sorted(self.spans, key=lambda record: record['start']):
+            start = record['start'] * 1e6
+            args = dict(record['args'])
+            if 'memory_peak' in record:
+                args['memory_peak_mb'] = round(record['memory_peak'] / 1048576, 3)
+                args['memory_delta_mb'] = round((record['memory_end'] - record['memory_start']) / 1048576, 3)
+                events.append({'name': 'Python内存', 'ph': 'C', 'ts': start + record['duration'] * 1e6,
+                               'pid': self.pid, 'args': {'MB': round(record['memory_end'] / 1048576, 3)}})
+            events.append({'name': record['name'], 'cat': record['name'].split('.')[0], 'ph': 'X',
+                           'ts': start, 'dur': record['duration'] * 1e6, 'pid': self.pid,
+                           'tid': record['thread'], 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def span(name, **args):
+    """
+    记录一个处理阶段：with span('ocr.inference', image=name) as s: ...
+
+    未开启剖析时返回空span，开销可以忽略
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, args)
+
+
+def enable(memory=True):
+    """开启剖析，返回Tracer"""
+    global _tracer
+    _tracer = Tracer(memory)
+    return _tracer
+
+
+def disable():
+    """关闭剖析，返回之前的Tracer（没有开启时返回None）"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def print_summary(tracer, limit=20):
+    """打印各阶段的耗时和内存峰值"""
+    print("\n===== 性能剖析 =====")
+    print(f"{'阶段':<28} {'次数':>6} {'总耗时(秒)':>12} {'最长(秒)':>10} {'内存峰值(MB)':>14}")
+    for total in tracer.summary()[:limit]:
+        peak = f"{total['memory_peak'] / 1048576:.1f}" if total['memory_peak'] is not None else '-'
+        print(f"{total['name']:<28} {total['count']:>6} {total['total']:>12.3f} {total['max']:>10.3f} {peak:>14}")
+
+
+def write_trace(tracer, path, trace_format='chrome'):
+    """把剖析记录写入文件，trace_format为chrome或json"""
+    data = tracer.to_chrome_trace() if trace_format == 'chrome' else tracer.to_json()
+    with atomic_write(path) as f:
+        json.dump(data, f, ensure_ascii=False)
+    print(f"性能剖析记录已保存至: {path}")
+
+
+def add_profile_arguments(parser):
+    """命令行参数：--profile、--profile_format、--no_profile_memory、--cprofile"""
+    parser.add_argument('--profile', metavar='TRACE',
+                        help='记录各阶段耗时，保存到该文件（默认Chrome trace格式，可用chrome://tracing或Perfetto打开）')
+    parser.add_argument('--profile_format', choices=['chrome', 'json'], default='chrome',
+                        help='剖析记录格式: chrome(Chrome trace事件) 或 json(span列表和汇总)')
+    parser.add_argument('--no_profile_memory', action='store_true',
+                        help='剖析时不用tracemalloc记录各阶段的Python内存峰值（记录内存会使运行变慢）')
+    parser.add_argument('--cprofile', metavar='PSTATS', help='用cProfile剖析整个运行过程，结果保存到该文件（pstats格式）')
+
+
+@contextlib.contextmanager
+def profile_session(args):
+    """
+    按命令行参数开启剖析，退出时打印汇总并保存记录；没有指定任何剖析参数时什么都不做
+    """
+    trace_path = getattr(args, 'profile', None)
+    cprofile_path = getattr(args, 'cprofile', None)
+    if not trace_path and not cprofile_path:
+        yield
+        return
+
+    tracer = enable(memory=not getattr(args, 'no_profile_memory', False)) if trace_path else None
+    profiler = None
+    if cprofile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span('run'):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            print(f"cProfile结果已保存至: {cprofile_path} (python -m pstats {cprofile_path})")
+        if tracer is not None:
+            disable()
+            print_summary(tracer)
+            write_trace(tracer, trace_path, getattr(args, 'profile_format', 'chrome'))
@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from models import InvestmentInfo
+
+# 只监听本机地址，不对外提供服务
+HOST = '127.0.0.1'
+CHANNELS = ('huabao', 'haitong', 'fund_e', 'auto')
+
+# 并发的OCR请求先在队列中等待batch_window秒凑成一批（最多max_batch张），
+# 同一批内内容相同的图片只识别一次，其余图片分给线程池中的常驻引擎并行推理
+BATCH_CONFIG = {'max_batch': 8, 'batch_window': 0.02}
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _ocr_image_bytes(payload, suffix, channel, cache, tile, preprocess):
+    """在工作线程中识别一张上传的图片：写入临时文件后交给process_image，返回 (渠道, 解析数据, 耗时)"""
+    from ocr import process_image
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        start = time.perf_counter()
+        detected_channel, parsed_data = process_image(path, channel, cache, tile, preprocess)
+        return detected_channel, parsed_data, time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+
+def classify_payload(payload):
+    """
+    对提交的投资记录分类并汇总，返回持仓、分类树汇总和报告
+
+    payload为ocr.process_images的结果（含data列表）或直接为投资记录列表，
+    可附带cash/cash_name添加现金资产
+    """
+    from sunburst.report import build_report
+    from sunburst.rollup import compute_rollup
+    from sunburst.rules import rules_fingerprint
+    from sunburst.sunburst import create_sunburst_data
+
+    if isinstance(payload, list):
+        payload = {'data': payload}
+    if not isinstance(payload, dict) or not isinstance(payload.get('data'), list):
+        raise HTTPError(400, "请求体应为投资记录列表，或包含data列表的JSON对象")
+
+    items = [item for item in payload['data'] if isinstance(item, dict)]
+    try:
+        cash = float(payload.get('cash') or 0)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "cash应为数字")
+    if cash > 0:
+        items.append(InvestmentInfo(name=payload.get('cash_name', '现金'), market_value=cash).to_dict())
+
+    try:
+        df = create_sunburst_data({'data': items})
+    except ValueError as e:
+        raise HTTPError(422, str(e))
+    rollup = compute_rollup(df)
+
+    # 去掉缺失的明细字段（NaN不是合法的JSON）
+    holdings = [{key: value for key, value in record.items()
+                 if value is not None and not (isinstance(value, float) and math.isnan(value))}
+                for record in df.to_dict('records')]
+    return {
+        'rules_fingerprint': rules_fingerprint(),
+        'holdings': holdings,
+        'report': build_report(df, rollup),
+    }
+
+
+class OCRBatcher:
+    """
+    OCR请求批处理
+
+    请求进入队列后由后台任务按批取出：第一个请求到达后最多再等batch_window秒，
+    凑够max_batch个就立即处理。同一批中图片内容和渠道都相同的请求合并为一次识别，
+    其余的提交到线程池（onnxruntime推理时释放GIL，多个线程共享已加载的引擎）。
+    """
+
+    def __init__(self, executor, cache=None, tile=True, preprocess=False,
+                 max_batch=BATCH_CONFIG['max_batch'], batch_window=BATCH_CONFIG['batch_window']):
+        self.executor = executor
+        self.cache = cache
+        self.tile = tile
+        self.preprocess = preprocess
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.stats = {'requests': 0, 'batches': 0, 'images': 0}
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    async def submit(self, payload, suffix='.png', channel='auto'):
+        """提交一张图片，等待所在批次处理完成后返回 (渠道, 解析数据, 耗时)"""
+        future = asyncio.get_running_loop().create_future()
+        self.stats['requests'] += 1
+        await self._queue.put((payload, suffix, channel, future))
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+
+            # 内容和渠道都相同的图片只识别一次
+            groups = {}
+            for payload, suffix, channel, future in batch:
+                key = (hashlib.sha256(payload).hexdigest(), channel)
+                groups.setdefault(key, (payload, suffix, channel, []))[3].append(future)
+
+            self.stats['batches'] += 1
+            self.stats['images'] += len(groups)
+            print(f"OCR批次: {len(batch)} 个请求, {len(groups)} 张图片")
+
+            jobs = [(futures, loop.run_in_executor(self.executor, _ocr_image_bytes, payload, suffix, channel,
+                                                   self.cache, self.tile, self.preprocess))
+                    for payload, suffix, channel, futures in groups.values()]
+            for futures, job in jobs:
+                try:
+                    result = await job
+                except Exception as e:
+                    result = e
+                for future in futures:
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+            # 命令行批量处理结束时才淘汰缓存，常驻服务每批之后按大小上限淘汰一次
+            if self.cache is not None:
+                try:
+                    removed = await loop.run_in_executor(None, self.cache.evict)
+                except OSError as e:
+                    print(f"淘汰OCR缓存失败: {e}")
+                else:
+                    if removed:
+                        print(f"淘汰OCR缓存: {removed} 个条目")
+
+
+class PortfolioServer:
+    """
+    本地HTTP服务：OCR引擎在启动时加载并常驻，其他工具直接提交截图或投资记录，省去每次调用的模型加载
+
+    接口:
+        GET  /health              服务状态、已加载的引擎和批处理统计
+        POST /ocr?channel=auto    请求体为图片原始字节，返回识别出的渠道和投资记录
+        POST /classify            请求体为投资记录JSON，返回分类后的持仓、分类树汇总和报告
+    """
+
+    def __init__(self, port=8765, workers=2, cache_dir=None, cache_size_mb=256, tile=True, preprocess=False,
+                 max_body_mb=32):
+        self.port = port
+        self.workers = workers
+        self.max_body = int(max_body_mb * 1024 * 1024)
+        self.started_at = None
+        # OCR推理用多线程，每个线程持有自己的常驻引擎（RapidOCR实例不是线程安全的）；
+        # 分类缓存不是线程安全的，分类汇总固定在单独一个线程中执行
+        self.ocr_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr',
+                                               initializer=self._init_ocr_thread)
+        self.classify_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='classify')
+        self.cache_dir = cache_dir
+        self.cache_size_mb = cache_size_mb
+        self.tile = tile
+        self.preprocess = preprocess
+        self.batcher = None
+        self._server = None
+
+    def _init_ocr_thread(self):
+        """OCR线程初始化：加载本线程独占的引擎"""
+        import ocr
+
+        ocr.use_thread_engines()
+        ocr.warm_up_engines()
+
+    def warm_up(self):
+        """预编译分类规则，并让OCR线程池中的每个线程都加载好自己的引擎"""
+        import ocr
+        from sunburst.classify import compile_rules
+
+        # 多个线程同时推理时限制每个引擎的线程数，避免CPU超额订阅
+        if self.workers > 1:
+            ocr._engine_options['intra_op_num_threads'] = max(1, (os.cpu_count() or 1) // self.workers)
+        compile_rules()
+
+        # 每个任务都等到workers个任务同时在运行才返回，保证线程池启动了全部线程（各自在初始化时加载引擎）
+        barrier = threading.Barrier(self.workers)
+        jobs = [self.ocr_executor.submit(barrier.wait, 600) for _ in range(self.workers)]
+        for job in jobs:
+            job.result()
+
+    async def start(self):
+        from ocr_cache import OCRCache
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.classify_executor, self.warm_up)
+
+        cache = OCRCache(self.cache_dir, self.cache_size_mb) if self.cache_dir else None
+        self.batcher = OCRBatcher(self.ocr_executor, cache, self.tile, self.preprocess)
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, HOST, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.started_at = time.time()
+        print(f"服务已启动: http://{HOST}:{self.port} (OCR线程数: {self.workers})")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.batcher is not None:
+            await self.batcher.stop()
+        self.ocr_executor.shutdown(wait=False)
+        self.classify_executor.shutdown(wait=False)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    async def _read_request(self, reader):
+        """读取一个HTTP请求，返回 (方法, 路径, 查询参数, 请求体)；连接关闭时返回None"""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "无效的请求行")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "无效的Content-Length")
+        if length > self.max_body:
+            raise HTTPError(413, f"请求体超过上限 {self.max_body} 字节")
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return method.upper(), url.path, query, body
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                request = await self._read_request(reader)
+                if request is None:
+                    return
+                status, body = 200, await self._dispatch(*request)
+            except HTTPError as e:
+                status, body = e.status, {'error': str(e)}
+            except asyncio.IncompleteReadError:
+                return
+            except Exception as e:
+                print(f"处理请求时出错: {e}")
+                status, body = 500, {'error': str(e)}
+
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            writer.write(f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+                         f"Content-Type: application/json; charset=utf-8\r\n"
+                         f"Content-Length: {len(data)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, query, body):
+        routes = {'/health': ('GET', self.handle_health),
+                  '/ocr': ('POST', self.handle_ocr),
+                  '/classify': ('POST', self.handle_classify)}
+        if path not in routes:
+            raise HTTPError(404, f"未知接口: {path}")
+        expected, handler = routes[path]
+        if method != expected:
+            raise HTTPError(405, f"{path} 只支持 {expected}")
+        return await handler(query, body)
+
+    async def handle_health(self, query, body):
+        from ocr import get_ocr_stats
+
+        return {
+            'status': 'ok',
+            'uptime': round(time.time() - self.started_at, 3),
+            'engines': sorted(get_ocr_stats()['cold_start']),
+            'pending': self.batcher.pending,
+            **self.batcher.stats,
+        }
+
+    async def handle_ocr(self, query, body):
+        if not body:
+            raise HTTPError(400, "请求体应为图片文件内容")
+        channel = query.get('channel', 'auto')
+        if channel not in CHANNELS:
+            raise HTTPError(400, f"不支持的渠道: {channel}")
+        # 按文件名保留扩展名，便于图片库识别格式
+        suffix = os.path.splitext(query.get('filename', ''))[1].lower() or '.png'
+
+        detected_channel, parsed_data, elapsed = await self.batcher.submit(body, suffix, channel)
+        if not (detected_channel and parsed_data):
+            raise HTTPError(422, "无法识别图片中的持仓数据")
+        for item in parsed_data:
+            item['source_type'] = detected_channel
+        return {'channel': detected_channel, 'data': parsed_data, 'elapsed': round(elapsed, 3)}
+
+    async def handle_classify(self, query, body):
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(400, "请求体应为JSON")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.classify_executor, classify_payload, payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f'在本机({HOST})启动OCR和分类的HTTP服务，OCR引擎常驻')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口，默认8765')
+    parser.add_argument('--workers', type=int, default=min(2, os.cpu_count() or 1),
+                        help='并行OCR推理的线程数，默认为2（单核机器为1）')
+    parser.add_argument('--cache_dir', '--cache-dir', dest='cache_dir',
+                        help='单张图片OCR缓存目录，相同图片直接返回缓存结果')
+    parser.add_argument('--cache_size', type=float, default=256, help='OCR缓存大小上限（MB），默认256')
+    parser.add_argument('--no_tile', action='store_true', help='竖长大图不分块，整图使用大图片模式识别')
+    parser.add_argument('--preprocess', action='store_true', help='OCR前灰度化、裁剪到持仓区域并缩小图片')
+    parser.add_argument('--max_body', type=float, default=32, help='请求体大小上限（MB），默认32')
+    args = parser.parse_args()
+
+    server = PortfolioServer(port=args.port, workers=args.workers, cache_dir=args.cache_dir,
+                             cache_size_mb=args.cache_size, tile=not args.no_tile, preprocess=args.preprocess,
+                             max_body_mb=args.max_body)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+
+
+if __name__ == "__main__":
+    main()
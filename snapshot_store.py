@@ -0,0 +1,228 @@
+import os
+import sqlite3
+from datetime import date, datetime
+
+import pandas as pd
+
+from models import DETAIL_FIELDS
+from sunburst.rollup import compute_rollup
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    taken_at TEXT NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    label TEXT,
+    total_value REAL NOT NULL,
+    holding_count INTEGER NOT NULL,
+    rules_fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_date ON snapshots (snapshot_date, taken_at);
+
+CREATE TABLE IF NOT EXISTS holdings (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    snapshot_date TEXT NOT NULL,
+    name TEXT,
+    code TEXT,
+    market_value REAL NOT NULL,
+    {', '.join(DETAIL_FIELDS)},
+    source_type TEXT,
+    level1 TEXT,
+    level2 TEXT,
+    level3 TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_holdings_snapshot ON holdings (snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_holdings_date ON holdings (snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_holdings_code ON holdings (code, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_holdings_category ON holdings (level1, level2, level3, snapshot_date);
+
+CREATE TABLE IF NOT EXISTS nodes (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    node_id TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    value REAL NOT NULL,
+    percentage REAL NOT NULL,
+    PRIMARY KEY (node_id, snapshot_id)
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_snapshot ON nodes (snapshot_id);
+"""
+
+# 只取每天最后一次快照；快照时间精确到秒，同一秒内的多份快照取最后插入的一份
+_LATEST_OF_DAY = """
+    s.id = (SELECT s2.id FROM snapshots s2 WHERE s2.snapshot_date = s.snapshot_date
+            ORDER BY s2.taken_at DESC, s2.id DESC LIMIT 1)
+"""
+
+
+def _none_if_nan(value):
+    return None if value is None or (isinstance(value, float) and value != value) else value
+
+
+def _date_text(value):
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+class SnapshotStore:
+    """
+    投资组合历史快照库（SQLite）
+
+    每次运行保存一份快照：持仓明细（投资信息 + 分类）以及分类树上每个节点的市值和占比。
+    持仓按日期、代码、分类建索引，分类节点按(节点ID, 快照)为主键，
+    查询某个分类多年来的占比变化只需按索引读取对应节点的行，不需要重新读取任何JSON。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_snapshot(self, df, taken_at=None, snapshot_date=None, label=None, rollup=None, rules_fingerprint=None):
+        """
+        保存一份快照，返回快照ID
+
+        Args:
+            df: 分类后的持仓数据框（create_sunburst_data或holdings_to_dataframe的结果）
+            taken_at: 快照时间，默认为当前时间
+            snapshot_date: 快照所属日期，默认取taken_at的日期（补录历史数据时指定）
+            label: 快照说明，例如图片目录
+            rollup: compute_rollup的结果，不传则现算
+            rules_fingerprint: 分类规则指纹，便于判断不同快照的分类口径是否一致
+        """
+        taken_at = taken_at or datetime.now()
+        if isinstance(taken_at, datetime):
+            taken_at = taken_at.isoformat(timespec='seconds')
+        snapshot_date = _date_text(snapshot_date) or taken_at[:10]
+        if rollup is None:
+            rollup = compute_rollup(df)
+        nodes = rollup[rollup['depth'] <= 3]
+
+        columns = ['name', 'code', 'value'] + list(DETAIL_FIELDS) + ['source', 'level1', 'level2', 'level3']
+        column_values = [df[column] if column in df.columns else [None] * len(df) for column in columns]
+        rows = [(snapshot_date,) + tuple(_none_if_nan(value) for value in row) for row in zip(*column_values)]
+
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO snapshots (taken_at, snapshot_date, label, total_value, holding_count, rules_fingerprint) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (taken_at, snapshot_date, label, float(df['value'].sum()), len(df), rules_fingerprint))
+            snapshot_id = cursor.lastrowid
+            self.conn.executemany(
+                f"INSERT INTO holdings (snapshot_id, snapshot_date, name, code, market_value, {', '.join(DETAIL_FIELDS)}, "
+                f"source_type, level1, level2, level3) VALUES ({snapshot_id}, {', '.join('?' * (len(columns) + 1))})",
+                rows)
+            self.conn.executemany(
+                'INSERT INTO nodes (snapshot_id, node_id, depth, value, percentage) VALUES (?, ?, ?, ?, ?)',
+                [(snapshot_id, node_id, int(depth), float(value), float(percentage))
+                 for node_id, depth, value, percentage in
+                 zip(nodes['id'], nodes['depth'], nodes['value'], nodes['percentage'])])
+        return snapshot_id
+
+    def delete_snapshot(self, snapshot_id):
+        """删除一份快照及其持仓、分类节点数据"""
+        with self.conn:
+            self.conn.execute('DELETE FROM snapshots WHERE id = ?', (snapshot_id,))
+
+    def _query(self, sql, params=()):
+        df = pd.read_sql_query(sql, self.conn, params=params)
+        if 'snapshot_date' in df.columns:
+            df['snapshot_date'] = pd.to_datetime(df['snapshot_date'])
+        return df
+
+    @staticmethod
+    def _date_filter(start, end, column='s.snapshot_date'):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append(f'{column} >= ?')
+            params.append(_date_text(start))
+        if end is not None:
+            clauses.append(f'{column} <= ?')
+            params.append(_date_text(end))
+        return clauses, params
+
+    def list_snapshots(self, start=None, end=None):
+        """列出日期范围内的所有快照"""
+        clauses, params = self._date_filter(start, end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self._query(
+            f'SELECT s.id, s.taken_at, s.snapshot_date, s.label, s.total_value, s.holding_count, s.rules_fingerprint '
+            f'FROM snapshots s {where} ORDER BY s.snapshot_date, s.taken_at', params)
+
+    def allocation_series(self, node, start=None, end=None, daily=True):
+        """
+        某个分类节点的市值和占比时间序列
+
+        Args:
+            node: 分类节点ID（各级分类用"/"连接，如"A股"、"A股/行业/医药"），或(一级, 二级, 三级)分类元组
+            start, end: 日期范围（含两端），默认不限
+            daily: 同一天有多份快照时只取当天最后一份
+
+        Returns:
+            pd.DataFrame: snapshot_date, taken_at, snapshot_id, total_value, value, percentage，
+                          某天的快照中没有该分类时市值和占比为0
+        """
+        if not isinstance(node, str):
+            node = '/'.join(filter(None, node))
+        clauses, params = self._date_filter(start, end)
+        if daily:
+            clauses.append(_LATEST_OF_DAY)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self._query(
+            f'SELECT s.snapshot_date, s.taken_at, s.id AS snapshot_id, s.total_value, '
+            f'COALESCE(n.value, 0) AS value, COALESCE(n.percentage, 0) AS percentage '
+            f'FROM snapshots s LEFT JOIN nodes n ON n.snapshot_id = s.id AND n.node_id = ? '
+            f'{where} ORDER BY s.snapshot_date, s.taken_at', [node] + params)
+
+    def allocation_table(self, depth=1, start=None, end=None, daily=True):
+        """
+        某一层所有分类节点的占比时间序列，每行一个快照、每列一个分类（便于画配置漂移图）
+        """
+        clauses, params = self._date_filter(start, end)
+        if daily:
+            clauses.append(_LATEST_OF_DAY)
+        clauses.append('n.depth = ?')
+        params.append(depth)
+        df = self._query(
+            f'SELECT s.snapshot_date, s.taken_at, n.node_id, n.percentage '
+            f"FROM snapshots s JOIN nodes n ON n.snapshot_id = s.id WHERE {' AND '.join(clauses)}", params)
+        table = df.pivot_table(index=['snapshot_date', 'taken_at'], columns='node_id', values='percentage', fill_value=0)
+        # 每天只有一份快照时按日期索引即可
+        return table.droplevel('taken_at') if daily else table
+
+    def holding_series(self, code, start=None, end=None):
+        """某个代码的持仓在各快照中的市值、数量时间序列"""
+        clauses, params = self._date_filter(start, end, column='h.snapshot_date')
+        clauses.insert(0, 'h.code = ?')
+        params.insert(0, code)
+        return self._query(
+            f'SELECT h.snapshot_date, h.snapshot_id, h.name, h.code, h.market_value, h.quantity, h.current_price, '
+            f'h.level1, h.level2, h.level3 FROM holdings h '
+            f"WHERE {' AND '.join(clauses)} ORDER BY h.snapshot_date, h.snapshot_id", params)
+
+    def load_holdings(self, snapshot_id=None):
+        """读取某份快照（默认最新一份）的持仓，列与create_sunburst_data的结果一致"""
+        if snapshot_id is None:
+            row = self.conn.execute('SELECT id FROM snapshots ORDER BY taken_at DESC, id DESC LIMIT 1').fetchone()
+            if row is None:
+                return pd.DataFrame(columns=['name', 'code', 'value', 'level1', 'level2', 'level3', 'source'])
+            snapshot_id = row[0]
+        return pd.read_sql_query(
+            f"SELECT name, code, market_value AS value, level1, level2, level3, source_type AS source, "
+            f"{', '.join(DETAIL_FIELDS)} FROM holdings WHERE snapshot_id = ?",
+            self.conn, params=(snapshot_id,))
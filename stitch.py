@@ -0,0 +1,140 @@
+from collections import defaultdict
+
+from profiling import span
+
+
+# 跨截图去重：同一个持仓列表分多张截图滚动截取时，相邻截图的重叠行会被重复解析。
+# 每条记录按 (渠道, 代码或名称, 持有数量, 市值) 计算键，新截图的开头与已有截图的结尾、
+# 新截图的结尾与已有截图的开头逐条比对，重叠部分只保留一份；同一张截图内的重复记录不受影响
+
+def record_key(record, channel=None):
+    """
+    记录的去重键，解析结果（market_value/source_type）和分类后的持仓（value/source）得到相同的键
+    """
+    channel = channel or record.get('source_type') or record.get('source')
+    value = record['market_value'] if 'market_value' in record else record.get('value')
+    return channel, record.get('code') or record.get('name'), record.get('quantity'), value
+
+
+class ScreenshotStitcher:
+    """
+    逐张加入截图的记录，去掉与之前截图重叠的部分，并由重叠关系推断截图的先后顺序
+
+    新截图的开头与之前某张截图从某一位置起到结尾的记录完全相同时，认为新截图接在它后面；
+    新截图从某一位置起到结尾的记录与之前某张截图的开头完全相同时，认为新截图在它前面；
+    一张截图的记录完整出现在另一张中时视为重复截图。所有记录的键建立索引，
+    只在与新截图第一条（或之前截图第一条）键相同的位置上比对，总耗时与记录数成线性关系，
+    截图不需要按滚动顺序传入。
+    """
+
+    def __init__(self):
+        self._names = []
+        self._keys = []
+        # 键 -> [(截图序号, 位置)]，以及各截图第一条记录的键 -> [截图序号]
+        self._positions = defaultdict(list)
+        self._first_keys = defaultdict(list)
+        # 推断出的相邻关系 (在前的截图序号, 在后的截图序号, 重叠条数)
+        self.links = []
+        self.removed = 0
+
+    def _head_overlaps(self, keys):
+        """新截图开头与之前截图的重叠：产出 (截图序号, 重叠条数, 是否为结尾相接)"""
+        for index, position in self._positions.get(keys[0], ()):
+            previous = self._keys[index]
+            count = min(len(previous) - position, len(keys))
+            if previous[position:position + count] == keys[:count]:
+                yield index, count, count == len(previous) - position and count < len(keys)
+
+    def _tail_overlaps(self, keys):
+        """新截图结尾与之前截图开头的重叠：产出 (截图序号, 新截图中的起始位置, 重叠条数, 是否为结尾相接)"""
+        for start, key in enumerate(keys):
+            for index in self._first_keys.get(key, ()):
+                previous = self._keys[index]
+                count = min(len(keys) - start, len(previous))
+                if keys[start:start + count] == previous[:count]:
+                    yield index, start, count, count == len(keys) - start and count < len(previous)
+
+    def add(self, name, channel, records):
+        """加入一张截图的记录，返回去掉重叠部分后的记录列表"""
+        keys = [record_key(record, channel) for record in records]
+        index = len(self._keys)
+        duplicated = [False] * len(keys)
+
+        if keys:
+            best_head = None
+            for previous, count, joined in self._head_overlaps(keys):
+                duplicated[:count] = [True] * count
+                if joined and (best_head is None or count > best_head[1]):
+                    best_head = (previous, count)
+            if best_head is not None:
+                self.links.append((best_head[0], index, best_head[1]))
+
+            best_tail = None
+            for previous, start, count, joined in self._tail_overlaps(keys):
+                duplicated[start:start + count] = [True] * count
+                if joined and (best_tail is None or count > best_tail[1]):
+                    best_tail = (previous, count)
+            if best_tail is not None:
+                self.links.append((index, best_tail[0], best_tail[1]))
+
+            for position, key in enumerate(keys):
+                self._positions[key].append((index, position))
+            self._first_keys[keys[0]].append(index)
+
+        self._names.append(name)
+        self._keys.append(keys)
+
+        kept = [record for record, dup in zip(records, duplicated) if not dup]
+        self.removed += len(records) - len(kept)
+        return kept
+
+    def order(self):
+        """
+        按重叠关系推断的截图顺序（名称列表）
+
+        重叠条数多的相邻关系优先，每张截图最多一个前驱和一个后继；连成的各段按段首截图的加入顺序排列，
+        没有重叠关系的截图保持加入顺序
+        """
+        successor, predecessor = {}, {}
+        for before, after, _ in sorted(self.links, key=lambda link: -link[2]):
+            if before in successor or after in predecessor:
+                continue
+            # 避免成环：after所在段的末尾不能是before
+            end = after
+            while end in successor:
+                end = successor[end]
+            if end == before:
+                continue
+            successor[before] = after
+            predecessor[after] = before
+
+        order = []
+        for index in range(len(self._names)):
+            if index in predecessor:
+                continue
+            while index is not None:
+                order.append(self._names[index])
+                index = successor.get(index)
+        return order
+
+
+def iter_stitched(image_results, stitcher=None):
+    """
+    去重阶段：逐张产出 (文件名, 渠道, 去掉与其他截图重叠部分后的解析数据)，全部处理完后打印推断的截图顺序
+
+    参数:
+        image_results: ocr.iter_process_images 产出的 (文件名, 渠道, 解析数据)
+        stitcher: ScreenshotStitcher，默认新建
+    """
+    stitcher = stitcher or ScreenshotStitcher()
+    for file_name, detected_channel, parsed_data in image_results:
+        if detected_channel and parsed_data:
+            with span('stitch', image=file_name):
+                kept = stitcher.add(file_name, detected_channel, parsed_data)
+            if len(kept) < len(parsed_data):
+                print(f"  - {file_name} 与其他截图重叠 {len(parsed_data) - len(kept)} 条，已去重")
+            parsed_data = kept
+        yield file_name, detected_channel, parsed_data
+
+    if stitcher.links:
+        print(f"跨截图去重: 共去掉 {stitcher.removed} 条重复记录，截图顺序: {' -> '.join(stitcher.order())}")
@@ -1,73 +1,13 @@
-# 默认分类规则
+import json
 import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from atomic_write import atomic_write
+from sunburst.rules import DEFAULT_CLASSIFICATION_RULES, rules_fingerprint
 
-DEFAULT_CLASSIFICATION_RULES = {
-    "rules": [
-        # 其他特殊分类，提前匹配
-        {"keywords": ["兴全合润", '交银施罗德定期支付双息平衡'], "match_any": True, "category": ["A股", "主动基金", "混合"]},
-        
-        # A股行业主题
-        {"keywords": ["医疗", "中证医疗", "医药", "医药卫生", "大摩健康产业混合", '中证生物科技', '融通健康'],
-         "match_any": True,
-         "exclude": ["恒生", "海外", "全球"],
-         "category": ["A股", "行业", "医药"]},
-        {"keywords": ["环保"], "category": ["A股", "行业", "环保"]},
-        {"keywords": ["养老"], "category": ["A股", "行业", "养老"]},
-        {"keywords": ["消费", "食品饮料", '文体娱乐'],
-         "exclude": ["恒生", "海外", "全球"],
-         "match_any": True, "category": ["A股", "行业", "消费"]},
-        {"keywords": ["信息", "信息技术"], "match_any": True, "category": ["A股", "行业", "信息"]},
-        {"keywords": ["农业"], "category": ["A股", "行业", "农业"]},
-        
-        # 能源相关
-        {"exact_match": ["国投电力", "盐湖股份", "淮北矿业"], "category": ["A股", "行业", "能源"]},
-        {"keywords": ["能源", "电力"], 
-         "match_any": True,
-         "exclude": ["恒生", "海外", "全球"],
-         "category": ["A股", "行业", "能源"]},
-
-        # 红利分类规则
-        {"keywords": ["红利"], "and_keywords": ["恒生", "港股", "央企"],
-         "category": ["海外新兴", "策略", "红利"]},
-        {"keywords": ["红利"],
-         "exclude": ["恒生", "港股", "央企"],
-         "category": ["A股", "策略", "红利"]},
-        {"keywords": ["500行业中性低波动指"],
-         "category": ["A股", "策略", "500低波动"]},
-
-        # 海外分类规则 - 香港市场
-        {"keywords": ["恒生科技"], "category": ["海外新兴", "海外科技", "恒生科技"]},
-        {"keywords": ["恒生医疗", "博时恒生医疗"], "match_any": True, "category": ["海外新兴", "海外医疗", "恒生医疗"]},
-        {"keywords": ["恒生消费"], "category": ["海外新兴", "香港", "恒生消费"]},
-        {"keywords": ["恒生"], 
-         "exclude": ["科技", "医疗", "消费", "红利"],
-         "category": ["海外新兴", "香港", "恒生"]},
-
-        # 海外分类规则 - 成熟市场
-        {"keywords": ["全球医疗"], "match_any": True, "category": ["海外成熟", "全球", "全球医疗"]},
-
-        # 海外互联网
-        {"keywords": ["互联网", "中概"], "match_any": True, "category": ["海外新兴", "海外科技", "海外互联"]},
-
-        # 证券行业
-        {"keywords": ["证券", "非银"], "match_any": True, "and_keywords": ["港股"],
-         "category": ["海外新兴", "行业", "非银"]},
-        {"keywords": ["证券", "非银"], "match_any": True, "category": ["A股", "行业", "证券"]},
-
-        # A股分类规则 - 宽基指数
-        {"keywords": ["500", "中证500"], "match_any": True, "category": ["A股", "中小盘", "500"]},
-        {"keywords": ["300", "沪深300"], "match_any": True, "category": ["A股", "大盘", "300"]},
-        {"keywords": ["创业板"], "category": ["A股", "中小盘", "创业板"]},
-
-        # 其他分类
-        {"keywords": ["债"], "and_keywords": ["国开债"], "category": ["债券", "国内债券", "纯债"]},
-        {"keywords": ["债"], "category": ["债券", "美债", "超长期债券"]},
-        {"regex": r"货币|添益|宝货币|现金|天添宝|添利宝", "category": ["货币", "货币", "货币"]},
-
-        # 默认分类
-        {"default": True, "category": ["其他", "其他", "其他"]}
-    ]
-}
 
 # 改进的股票/基金分类映射函数
 def classify_holding(name, code=None, rules=None, verbose=False):
@@ -171,3 +111,393 @@ def classify_holding(name, code=None, rules=None, verbose=False):
     if verbose:
         print(f"  ! 未找到匹配规则，使用兜底分类")
     return ("其他", "其他", "其他")
+
+
+# 预编译的分类规则集
+class CompiledRuleSet:
+    """
+    预编译的分类规则集，分类结果与classify_holding完全一致
+
+    所有规则中的关键词（keywords、and_keywords、exclude）构建成一个Aho-Corasick自动机，
+    每个名称只扫描一遍就得到全部命中的关键词（位集合）；再只在可能匹配的候选规则中按原规则顺序
+    找出第一条匹配的规则。正则规则预先编译，且只有排在它前面的规则都不匹配时才会执行。
+    """
+
+    def __init__(self, rules=None):
+        if rules is None:
+            rules = DEFAULT_CLASSIFICATION_RULES["rules"]
+        self.rules = rules
+        self.fingerprint = rules_fingerprint(rules)
+
+        self._keyword_bits = {}
+        self._empty_mask = 0  # 空字符串关键词总是命中
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]       # 每个状态命中的关键词位集合
+        self._triggers = [()]    # 每个状态命中的关键词可能触发的规则
+        self._compiled = []
+        self._always = []        # 无论命中哪些关键词都要检查的规则（正则、默认、空关键词等）
+        self._exact = {}         # 精确匹配名称 -> 规则序号
+
+        keyword_rules = {}
+        for index, rule in enumerate(rules):
+            self._compiled.append(self._compile_rule(index, rule, keyword_rules))
+        self._build_automaton(keyword_rules)
+
+    def _keyword_mask(self, keywords):
+        mask = 0
+        for kw in keywords:
+            bit = self._keyword_bits.get(kw)
+            if bit is None:
+                bit = len(self._keyword_bits)
+                self._keyword_bits[kw] = bit
+                if kw:
+                    self._add_keyword(kw, bit)
+                else:
+                    self._empty_mask |= 1 << bit
+            mask |= 1 << bit
+        return mask
+
+    def _add_keyword(self, kw, bit):
+        state = 0
+        for ch in kw:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+                self._triggers.append(())
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._output[state] |= 1 << bit
+
+    def _compile_rule(self, index, rule, keyword_rules):
+        exact = rule.get("exact_match")
+        if exact is not None:
+            if isinstance(exact, (list, tuple, set, frozenset)):
+                for name in exact:
+                    self._exact.setdefault(name, []).append(index)
+            else:
+                self._always.append(index)
+
+        has_keywords = "keywords" in rule
+        match_any = rule.get("match_any", False)
+        keywords = rule.get("keywords", [])
+        kw_mask = self._keyword_mask(keywords)
+        and_mask = self._keyword_mask(rule["and_keywords"]) if "and_keywords" in rule else None
+        exclude_mask = self._keyword_mask(rule["exclude"]) if "exclude" in rule else None
+
+        if has_keywords:
+            # all()对空关键词列表恒为真，含空字符串关键词时也可能不依赖任何命中
+            if (not match_any and not keywords) or "" in keywords:
+                self._always.append(index)
+            for kw in keywords:
+                keyword_rules.setdefault(kw, set()).add(index)
+
+        regex = re.compile(rule["regex"]) if "regex" in rule else None
+        is_default = rule.get("default", False)
+        if regex is not None or is_default:
+            self._always.append(index)
+
+        return (exact, has_keywords, match_any, kw_mask, and_mask, exclude_mask,
+                regex, is_default, tuple(rule["category"]) if "category" in rule else None)
+
+    def _build_automaton(self, keyword_rules):
+        goto, fail, output, triggers = self._goto, self._fail, self._output, self._triggers
+        bit_rules = {self._keyword_bits[kw]: rules for kw, rules in keyword_rules.items()}
+
+        def rules_for(mask):
+            result = set()
+            while mask:
+                low = mask & -mask
+                result |= bit_rules.get(low.bit_length() - 1, set())
+                mask ^= low
+            return tuple(sorted(result))
+
+        # 广度优先计算失败指针，并把失败指针上的输出合并到当前状态
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] |= output[fail[nxt]]
+                queue.append(nxt)
+        for state in range(len(goto)):
+            triggers[state] = rules_for(output[state])
+
+        self._always = sorted(set(self._always))
+
+    def _candidates(self, name):
+        """扫描一遍名称，返回 (命中关键词的位集合, 按规则顺序排列的候选规则序号)"""
+        goto, fail, output, triggers = self._goto, self._fail, self._output, self._triggers
+        candidates = set(self._always)
+        candidates.update(self._exact.get(name, ()))
+        state = 0
+        hits = self._empty_mask
+        for ch in name:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if triggers[state]:
+                candidates.update(triggers[state])
+            hits |= output[state]
+        return hits, sorted(candidates)
+
+    def match_rule(self, name):
+        """返回第一条匹配的规则序号，没有匹配的规则时返回None"""
+        hits, candidates = self._candidates(name)
+        for index in candidates:
+            (exact, has_keywords, match_any, kw_mask, and_mask, exclude_mask,
+             regex, is_default, _) = self._compiled[index]
+
+            # 精确匹配
+            if exact is not None and name in exact:
+                return index
+
+            # 关键词匹配
+            if has_keywords:
+                if match_any:
+                    keywords_match = hits & kw_mask != 0
+                else:
+                    keywords_match = hits & kw_mask == kw_mask
+                if and_mask is not None:
+                    if keywords_match and hits & and_mask:
+                        return index
+                elif exclude_mask is not None:
+                    if keywords_match and not hits & exclude_mask:
+                        return index
+                elif keywords_match:
+                    return index
+
+            # 正则表达式匹配
+            if regex is not None and regex.search(name):
+                return index
+
+            # 默认规则
+            if is_default:
+                return index
+        return None
+
+    def classify(self, name, code=None):
+        """
+        根据名称判断持仓项的分类（code参数仅为与classify_holding保持一致，规则不使用代码）
+
+        Returns:
+            tuple: (一级分类, 二级分类, 三级分类)
+        """
+        index = self.match_rule(name)
+        if index is None:
+            return ("其他", "其他", "其他")
+        return self._compiled[index][-1]
+
+
+# 向量化的批量分类
+def _contains_any(names, keywords):
+    """names中包含任一关键词的行（any([])为False）"""
+    mask = np.zeros(len(names), dtype=bool)
+    for kw in keywords:
+        mask |= names.str.contains(kw, regex=False).to_numpy(dtype=bool)
+    return mask
+
+
+def _contains_all(names, keywords):
+    """names中包含全部关键词的行（all([])为True）"""
+    mask = np.ones(len(names), dtype=bool)
+    for kw in keywords:
+        mask &= names.str.contains(kw, regex=False).to_numpy(dtype=bool)
+    return mask
+
+
+def _rule_mask(rule, names):
+    """对一列名称整体计算规则是否匹配，判断逻辑与classify_holding逐条匹配一致"""
+    mask = np.zeros(len(names), dtype=bool)
+
+    # 精确匹配
+    if "exact_match" in rule:
+        exact = rule["exact_match"]
+        if isinstance(exact, (list, tuple, set, frozenset)):
+            mask |= names.isin(list(exact)).to_numpy(dtype=bool)
+        else:
+            mask |= np.fromiter((name in exact for name in names), dtype=bool, count=len(names))
+
+    # 关键词匹配
+    if "keywords" in rule:
+        if rule.get("match_any", False):
+            keywords_match = _contains_any(names, rule["keywords"])
+        else:
+            keywords_match = _contains_all(names, rule["keywords"])
+
+        if "and_keywords" in rule:
+            mask |= keywords_match & _contains_any(names, rule["and_keywords"])
+        elif "exclude" in rule:
+            mask |= keywords_match & ~_contains_any(names, rule["exclude"])
+        else:
+            mask |= keywords_match
+
+    # 正则表达式匹配
+    if "regex" in rule:
+        mask |= names.str.contains(rule["regex"], regex=True).to_numpy(dtype=bool)
+
+    # 默认规则
+    if rule.get("default", False):
+        mask[:] = True
+
+    return mask
+
+
+def _classify_names(names, rules):
+    """按规则顺序整列匹配，每条规则只作用于尚未分类的名称，全部分类后提前结束；返回规则序号数组（-1为未匹配）"""
+    assigned = np.full(len(names), -1, dtype=np.int64)
+    remaining = np.arange(len(names))
+    for index, rule in enumerate(rules):
+        if len(remaining) == 0:
+            break
+        matched = _rule_mask(rule, names.iloc[remaining])
+        assigned[remaining[matched]] = index
+        remaining = remaining[~matched]
+    return assigned
+
+
+def classify_holdings(names, codes=None, rules=None, cache=None):
+    """
+    批量分类，结果与对每一行调用classify_holding相同
+
+    Args:
+        names: 持仓名称的pd.Series
+        codes: 持仓代码的pd.Series（规则不使用代码，仅作为缓存键的一部分）
+        rules: 分类规则，如果为None则使用默认规则
+        cache: 可选的ClassificationCache，命中的名称不再参与规则匹配
+
+    Returns:
+        pd.DataFrame: 与names索引相同，包含level1、level2、level3三列
+    """
+    if rules is None:
+        rules = DEFAULT_CLASSIFICATION_RULES["rules"]
+    if codes is None:
+        codes = pd.Series('', index=names.index)
+
+    names_str = names.fillna('').astype(str)
+    codes_str = codes.fillna('').astype(str)
+
+    # 相同的 (名称, 代码) 只分类一次
+    pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([names_str, codes_str]))
+    pair_names = pd.Series(pairs.get_level_values(0), dtype=object)
+    pair_codes_unique = pairs.get_level_values(1)
+    categories = [None] * len(pairs)
+
+    fingerprint = rules_fingerprint(rules) if cache is not None else None
+    if cache is not None:
+        for i, (name, code) in enumerate(zip(pair_names, pair_codes_unique)):
+            categories[i] = cache.get(name, code, fingerprint)
+    misses = np.array([i for i, category in enumerate(categories) if category is None], dtype=np.int64)
+
+    if len(misses):
+        # 分类只依赖名称，未命中的名称再去重后整列匹配
+        miss_names = pair_names.iloc[misses]
+        name_codes, unique_names = pd.factorize(miss_names)
+        assigned = _classify_names(pd.Series(unique_names, dtype=object), rules)
+        for i, rule_index in zip(misses, assigned[name_codes]):
+            category = tuple(rules[rule_index]["category"]) if rule_index >= 0 else ("其他", "其他", "其他")
+            categories[i] = category
+            if cache is not None:
+                cache.put(pair_names.iloc[i], pair_codes_unique[i], fingerprint, category)
+
+    levels = np.array(categories, dtype=object).reshape(len(pairs), 3)[pair_codes]
+    return pd.DataFrame({'level1': levels[:, 0], 'level2': levels[:, 1], 'level3': levels[:, 2]},
+                        index=names.index)
+
+
+# 按指纹复用已编译的规则集
+_compiled_rule_sets = OrderedDict()
+
+
+def compile_rules(rules=None, maxsize=8):
+    """返回规则对应的CompiledRuleSet，内容相同的规则只编译一次"""
+    if rules is None:
+        rules = DEFAULT_CLASSIFICATION_RULES["rules"]
+    fingerprint = rules_fingerprint(rules)
+    rule_set = _compiled_rule_sets.get(fingerprint)
+    if rule_set is None:
+        rule_set = CompiledRuleSet(rules)
+        _compiled_rule_sets[fingerprint] = rule_set
+        while len(_compiled_rule_sets) > maxsize:
+            _compiled_rule_sets.popitem(last=False)
+    else:
+        _compiled_rule_sets.move_to_end(fingerprint)
+    return rule_set
+
+
+# 分类结果缓存
+class ClassificationCache:
+    """
+    名称→分类的LRU缓存，键为 (名称, 代码, 规则指纹)
+
+    规则改动后指纹随之改变，旧结果不会再被命中。指定path时可持久化到磁盘，
+    保存时只保留本次用到的规则指纹下的条目，过期规则的结果自动清除。
+    """
+
+    def __init__(self, maxsize=100000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._active_fingerprints = set()
+        if path:
+            self.load()
+
+    def get(self, name, code, fingerprint):
+        """返回缓存的分类元组，未命中时返回None"""
+        self._active_fingerprints.add(fingerprint)
+        key = (name, code or '', fingerprint)
+        category = self._entries.get(key)
+        if category is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return category
+
+    def put(self, name, code, fingerprint, category):
+        key = (name, code or '', fingerprint)
+        self._entries[key] = tuple(category)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def classify(self, rule_set, name, code=None):
+        """先查缓存，未命中时用rule_set分类并写入缓存"""
+        category = self.get(name, code, rule_set.fingerprint)
+        if category is None:
+            category = rule_set.classify(name, code)
+            self.put(name, code, rule_set.fingerprint, category)
+        return category
+
+    def load(self):
+        """从磁盘加载缓存，文件不存在或已损坏时忽略"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for name, code, fingerprint, category in data.get('entries', []):
+                self._entries[(name, code, fingerprint)] = tuple(category)
+        except (OSError, ValueError, TypeError):
+            self._entries.clear()
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """保存到磁盘（先写临时文件再替换）"""
+        if not self.path:
+            return
+        entries = [[name, code, fingerprint, list(category)]
+                   for (name, code, fingerprint), category in self._entries.items()
+                   if not self._active_fingerprints or fingerprint in self._active_fingerprints]
+        with atomic_write(self.path) as f:
+            json.dump({'entries': entries}, f, ensure_ascii=False)
+
+
+# 进程内默认的分类结果缓存
+default_classification_cache = ClassificationCache()
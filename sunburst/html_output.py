@@ -0,0 +1,122 @@
+import base64
+import hashlib
+import json
+import os
+
+import plotly
+from plotly.offline import get_plotlyjs
+from plotly.io._utils import plotly_cdn_url
+from plotly.utils import PlotlyJSONEncoder
+
+from atomic_write import atomic_write
+
+# plotly.js的引入方式：cdn(引用CDN，需要联网)、inline(内嵌到HTML，离线可用)、
+# shared(在报告目录旁缓存一份plotly.min.js，多个报告共用，离线可用)
+PLOTLYJS_MODES = ('cdn', 'inline', 'shared')
+
+_PLOTLY_WINDOW_CONFIG = '<script type="text/javascript">window.PlotlyConfig = {MathJaxConfig: \'local\'};</script>'
+
+# plotly.js源码及其完整性校验值只在进程内读取/计算一次
+_plotlyjs_cache = {}
+
+
+class _ScriptSafeEncoder(PlotlyJSONEncoder):
+    """嵌入<script>标签的JSON：转义字符串中的</，避免持仓名称等文本提前结束脚本"""
+
+    def iterencode(self, o, _one_shot=False):
+        for chunk in super().iterencode(o, _one_shot):
+            yield chunk.replace('</', '<\\/')
+
+
+def _plotlyjs_source():
+    if 'source' not in _plotlyjs_cache:
+        _plotlyjs_cache['source'] = get_plotlyjs()
+    return _plotlyjs_cache['source']
+
+
+def _plotlyjs_integrity():
+    if 'integrity' not in _plotlyjs_cache:
+        digest = hashlib.sha384(_plotlyjs_source().encode('utf-8')).digest()
+        _plotlyjs_cache['integrity'] = 'sha384-' + base64.b64encode(digest).decode('ascii')
+    return _plotlyjs_cache['integrity']
+
+
+def shared_plotlyjs_path(plotlyjs_dir):
+    """共用的plotly.js文件路径，文件名带版本号，升级plotly后不会引用到旧版本"""
+    return os.path.join(plotlyjs_dir, f"plotly-{plotly.__version__}.min.js")
+
+
+def ensure_shared_plotlyjs(plotlyjs_dir):
+    """
+    确保目录中有当前版本的plotly.js，不存在时写入（先写临时文件再替换），返回文件路径
+
+    同一目录下生成的所有报告都引用这一份文件，只在第一次生成时写入。
+    """
+    path = shared_plotlyjs_path(plotlyjs_dir)
+    if os.path.exists(path):
+        return path
+
+    with atomic_write(path) as f:
+        f.write(_plotlyjs_source())
+    print(f"已缓存plotly.js: {path}")
+    return path
+
+
+def _write_plotlyjs(f, output_file, plotlyjs, plotlyjs_dir):
+    """写入加载plotly.js的脚本标签"""
+    f.write(_PLOTLY_WINDOW_CONFIG)
+    if plotlyjs == 'cdn':
+        f.write(f'<script charset="utf-8" src="{plotly_cdn_url()}" integrity="{_plotlyjs_integrity()}" '
+                f'crossorigin="anonymous"></script>\n')
+    elif plotlyjs == 'inline':
+        f.write('<script type="text/javascript">')
+        f.write(_plotlyjs_source())
+        f.write('</script>\n')
+    elif plotlyjs == 'shared':
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        bundle_path = ensure_shared_plotlyjs(plotlyjs_dir or output_dir)
+        src = os.path.relpath(bundle_path, output_dir).replace(os.sep, '/')
+        f.write(f'<script charset="utf-8" src="{src}"></script>\n')
+    else:
+        raise ValueError(f"不支持的plotly.js引入方式: {plotlyjs}，可选: {', '.join(PLOTLYJS_MODES)}")
+
+
+# 输出图表HTML
+def write_figure_html(fig, output_file, config=None, div_id='sunburst-chart', post_script='',
+                      plotlyjs='cdn', plotlyjs_dir=None, width='1200px', height='1200px'):
+    """
+    把plotly图表直接写入HTML文件
+
+    图表数据用紧凑格式直接序列化到文件流，不再先生成整页HTML字符串再反复替换；
+    先写临时文件再替换，正在打开的旧报告不会被写了一半的文件覆盖。
+
+    Args:
+        fig: plotly图表对象
+        output_file: 输出HTML文件路径
+        config: plotly配置
+        div_id: 图表容器ID
+        post_script: 追加在页面末尾的脚本（完整的<script>标签）
+        plotlyjs: plotly.js引入方式，见PLOTLYJS_MODES
+        plotlyjs_dir: shared模式下缓存plotly.js的目录，默认与输出文件同目录
+        width, height: 图表容器尺寸
+    """
+    figure = fig.to_dict()
+    dump = {'cls': _ScriptSafeEncoder, 'separators': (',', ':'), 'ensure_ascii': False}
+
+    with atomic_write(output_file) as f:
+        f.write('<!doctype html>\n<html>\n<head>\n<meta charset="utf-8" />\n'
+                '<style>html, body {height: 100%;}</style>\n</head>\n<body>\n')
+        _write_plotlyjs(f, output_file, plotlyjs, plotlyjs_dir)
+        f.write(f'<div id="{div_id}" class="plotly-graph-div" style="height:{height}; width:{width};"></div>\n')
+        f.write('<script type="text/javascript">window.PLOTLYENV=window.PLOTLYENV || {};'
+                f'if (document.getElementById("{div_id}")) {{Plotly.newPlot("{div_id}",')
+        json.dump(figure.get('data', []), f, **dump)
+        f.write(',')
+        json.dump(figure.get('layout', {}), f, **dump)
+        f.write(',')
+        json.dump(config or {}, f, **dump)
+        f.write(')};</script>\n')
+        f.write(post_script)
+        f.write('</body>\n</html>\n')
+
+    return output_file
@@ -0,0 +1,181 @@
+import csv
+import io
+import json
+import sys
+
+from atomic_write import atomic_write
+from sunburst.rollup import LEVELS, compute_rollup, rollup_level, rollup_total
+
+CSV_FIELDS = ['depth', 'id', 'parent', 'level1', 'level2', 'level3', 'name', 'code',
+              'value', 'percentage', 'parent_percentage']
+
+
+def _node_record(row):
+    """分类节点转为普通字典（去掉numpy类型，便于输出JSON）"""
+    return {
+        'id': row.id,
+        'parent': row.parent,
+        'depth': int(row.depth),
+        'level1': row.level1,
+        'level2': row.level2 if row.depth >= 2 else None,
+        'level3': row.level3 if row.depth >= 3 else None,
+        'value': float(row.value),
+        'percentage': float(row.percentage),
+        'parent_percentage': float(row.parent_percentage),
+    }
+
+
+# 生成投资组合报告数据
+def build_report(df, rollup=None):
+    """
+    一次性计算投资组合报告需要的所有汇总数据
+
+    分类汇总来自同一份分类树汇总，具体持仓整体按市值排序一次后按三级分类取出，
+    不再对每个分类重复分组、求和、排序。
+
+    Args:
+        df: create_sunburst_data生成的持仓数据框
+        rollup: compute_rollup的结果，不传则现算
+
+    Returns:
+        dict: total_value(总市值)、level1/level2/level3(各级分类按市值排序)、
+              tree(一级->二级->三级->具体持仓的嵌套结构，各层按市值排序)
+    """
+    if rollup is None:
+        rollup = compute_rollup(df)
+    total_value = float(rollup_total(rollup))
+
+    # 各级分类汇总表
+    levels = {}
+    for depth in (1, 2, 3):
+        nodes = rollup_level(rollup, depth).sort_values('value', ascending=False)
+        levels[depth] = [_node_record(row) for row in nodes.itertuples(index=False)]
+
+    # 具体持仓：整体按市值排序一次，再按三级分类取出各自的行
+    holdings = df.sort_values('value', ascending=False, kind='stable')
+    records = [
+        {'name': name, 'code': code, 'value': float(value), 'percentage': float(value / total_value * 100)}
+        for name, code, value in zip(holdings['name'], holdings['code'], holdings['value'])
+    ]
+    holdings_by_category = {
+        key: [records[i] for i in positions]
+        for key, positions in holdings.groupby(LEVELS, sort=False).indices.items()
+    }
+
+    # 分类持仓明细按市值从大到小排序，市值相同时保持分类名称顺序
+    ranked = rollup.sort_values('value', ascending=False, kind='stable')
+    children = {}
+    for row in ranked.itertuples(index=False):
+        children.setdefault(row.parent, []).append(_node_record(row))
+
+    tree = []
+    for node1 in children.get('', []):
+        tree.append(node1)
+        node1['children'] = children.get(node1['id'], [])
+        for node2 in node1['children']:
+            node2['children'] = children.get(node2['id'], [])
+            for node3 in node2['children']:
+                node3['holdings'] = holdings_by_category.get((node3['level1'], node3['level2'], node3['level3']), [])
+
+    return {
+        'total_value': total_value,
+        'level1': levels[1],
+        'level2': levels[2],
+        'level3': levels[3],
+        'tree': tree,
+    }
+
+
+# 输出文本报告
+def write_text_report(report, stream):
+    """按print_portfolio_summary的格式把报告写入文本流"""
+    write = stream.write
+    total_value = report['total_value']
+
+    write("\n===== 投资组合总览 =====\n")
+    write(f"总市值: {total_value:,.2f}\n")
+    write("\n\n")
+
+    write("===== 一级分类汇总 =====\n")
+    for node in report['level1']:
+        write(f"{node['level1']}: {node['value']:,.2f} ({node['percentage']:.2f}%)\n")
+    write("\n\n")
+
+    write("===== 二级分类汇总 =====\n")
+    for node in report['level2']:
+        write(f"{node['level1']} - {node['level2']}: {node['value']:,.2f} ({node['percentage']:.2f}%)\n")
+    write("\n\n")
+
+    write("===== 详细持仓数据 =====\n")
+    write(f"{'一级分类':<10} {'二级分类':<10} {'三级分类':<10} {'市值':>12} {'占比':>8}\n")
+    write("-" * 60 + "\n")
+    for node in report['level3']:
+        write(f"{node['level1']:<10} {node['level2']:<10} {node['level3']:<10} "
+              f"{node['value']:>12,.2f} {node['percentage']:>7.2f}%\n")
+
+    write("\n===== 分类持仓明细 =====\n")
+    for node1 in report['tree']:
+        write(f"\n## {node1['level1']} (总市值: {node1['value']:,.2f}, 占比: {node1['percentage']:.2f}%)\n")
+        for node2 in node1['children']:
+            write(f"\n### {node2['level2']} (市值: {node2['value']:,.2f}, 占比: {node2['percentage']:.2f}%)\n")
+            for node3 in node2['children']:
+                write(f"\n#### {node3['level3']} (市值: {node3['value']:,.2f}, 占比: {node3['percentage']:.2f}%)\n")
+                write(f"{'名称':<20} {'代码':<10} {'市值':>12} {'占比':>8}\n")
+                write("-" * 60 + "\n")
+                for holding in node3['holdings']:
+                    write(f"{holding['name']:<20} {holding['code']:<10} "
+                          f"{holding['value']:>12,.2f} {holding['percentage']:>7.2f}%\n")
+
+
+def print_report(report, stream=None):
+    """先在内存中拼好整份文本报告，再一次性写出"""
+    buffer = io.StringIO()
+    write_text_report(report, buffer)
+    (stream or sys.stdout).write(buffer.getvalue())
+
+
+# 输出机器可读的报告
+def write_json_report(report, stream):
+    """把报告以JSON格式写入文本流"""
+    json.dump(report, stream, ensure_ascii=False, indent=2)
+    stream.write("\n")
+
+
+def write_csv_report(report, stream):
+    """
+    把报告以CSV格式写入文本流，每行一个分类节点或具体持仓，按分类树先序排列
+
+    depth为1-3表示分类节点，4表示具体持仓（id为空，parent为所属三级分类）
+    """
+    writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    for node1 in report['tree']:
+        writer.writerow(node1)
+        for node2 in node1['children']:
+            writer.writerow(node2)
+            for node3 in node2['children']:
+                writer.writerow(node3)
+                for holding in node3['holdings']:
+                    writer.writerow({
+                        **holding,
+                        'depth': 4,
+                        'id': '',
+                        'parent': node3['id'],
+                        'level1': node3['level1'],
+                        'level2': node3['level2'],
+                        'level3': node3['level3'],
+                        'parent_percentage': holding['value'] / node3['value'] * 100,
+                    })
+
+
+def save_report(report, output_file, fmt=None):
+    """
+    保存报告到文件，格式由fmt或文件扩展名决定（json/csv/txt）
+    """
+    fmt = fmt or output_file.rsplit('.', 1)[-1].lower()
+    writers = {'json': write_json_report, 'csv': write_csv_report, 'txt': write_text_report}
+    if fmt not in writers:
+        raise ValueError(f"不支持的报告格式: {fmt}")
+    with atomic_write(output_file, newline='') as f:
+        writers[fmt](report, f)
+    return output_file
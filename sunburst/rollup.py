@@ -0,0 +1,80 @@
+import pandas as pd
+
+LEVELS = ['level1', 'level2', 'level3']
+
+
+def _node_id(*parts):
+    """节点ID：各级分类名称用/连接，空名称跳过（与旭日图的ID规则一致）"""
+    return '/'.join(filter(None, parts))
+
+
+# 分类树汇总
+def compute_rollup(df, include_holdings=False):
+    """
+    计算分类树上每个节点的市值和占比，每一层只做一次groupby（下一层在上一层的汇总结果上聚合）
+
+    Args:
+        df: create_sunburst_data生成的持仓数据框
+        include_holdings: 是否在三级分类下加入具体持仓作为叶子节点
+
+    Returns:
+        pd.DataFrame: 每行一个节点，列为
+            id, parent, label, depth(1-3为分类层级，4为持仓),
+            level1, level2, level3, name, code,
+            value(市值), percentage(占总市值百分比), parent_percentage(占父节点百分比)
+    """
+    level3 = df.groupby(LEVELS, sort=True)['value'].sum().reset_index()
+    level2 = level3.groupby(LEVELS[:2], sort=True)['value'].sum().reset_index()
+    level1 = level2.groupby('level1', sort=True)['value'].sum().reset_index()
+    total_value = level1['value'].sum()
+
+    level1['id'] = level1['level1'].map(_node_id)
+    level1['parent'] = ''
+    level1['label'] = level1['level1']
+
+    level2['id'] = [_node_id(l1, l2) for l1, l2 in zip(level2['level1'], level2['level2'])]
+    level2['parent'] = level2['level1'].map(_node_id)
+    level2['label'] = level2['level2']
+
+    level3['id'] = [_node_id(l1, l2, l3) for l1, l2, l3 in
+                    zip(level3['level1'], level3['level2'], level3['level3'])]
+    level3['parent'] = [_node_id(l1, l2) for l1, l2 in zip(level3['level1'], level3['level2'])]
+    level3['label'] = level3['level3']
+
+    frames = [level1.assign(depth=1), level2.assign(depth=2), level3.assign(depth=3)]
+
+    if include_holdings:
+        # 名称、代码为Categorical，只保留实际出现的组合（pandas 3之前observed默认为False，会生成所有类别的笛卡尔积）
+        holdings = df.groupby(LEVELS + ['name', 'code'], sort=True, dropna=False,
+                              observed=True)['value'].sum().reset_index()
+        holdings['parent'] = [_node_id(l1, l2, l3) for l1, l2, l3 in
+                              zip(holdings['level1'], holdings['level2'], holdings['level3'])]
+        holdings['id'] = [f"{parent}/{name}" + (f"({code})" if isinstance(code, str) and code else '')
+                          for parent, name, code in zip(holdings['parent'], holdings['name'], holdings['code'])]
+        holdings['label'] = holdings['name']
+        frames.append(holdings.assign(depth=4))
+
+    rollup = pd.concat(frames, ignore_index=True)
+    rollup = rollup.reindex(columns=['id', 'parent', 'label', 'depth'] + LEVELS + ['name', 'code', 'value'])
+
+    rollup['percentage'] = rollup['value'] / total_value * 100
+    parent_values = rollup['parent'].map(dict(zip(rollup['id'], rollup['value'])))
+    rollup['parent_percentage'] = (rollup['value'] / parent_values.fillna(total_value)) * 100
+
+    return rollup
+
+
+def rollup_total(rollup):
+    """分类树的总市值"""
+    return rollup.loc[rollup['depth'] == 1, 'value'].sum()
+
+
+def rollup_level(rollup, depth):
+    """取出某一层的节点"""
+    return rollup[rollup['depth'] == depth].reset_index(drop=True)
+
+
+def rollup_percentages(rollup):
+    """分类节点ID到占总市值百分比的映射（供旭日图脚本使用），名称为空的一、二级分类不单独列出"""
+    nodes = rollup[(rollup['depth'] == 3) | ((rollup['depth'] < 3) & (rollup['label'].astype(bool)))]
+    return dict(zip(nodes['id'], nodes['percentage'].astype(float)))
@@ -0,0 +1,80 @@
+import hashlib
+import json
+
+# 默认分类规则
+DEFAULT_CLASSIFICATION_RULES = {
+    "rules": [
+        # 其他特殊分类，提前匹配
+        {"keywords": ["兴全合润", '交银施罗德定期支付双息平衡'], "match_any": True, "category": ["A股", "主动基金", "混合"]},
+        
+        # A股行业主题
+        {"keywords": ["医疗", "中证医疗", "医药", "医药卫生", "大摩健康产业混合", '中证生物科技', '融通健康'],
+         "match_any": True,
+         "exclude": ["恒生", "海外", "全球"],
+         "category": ["A股", "行业", "医药"]},
+        {"keywords": ["环保"], "category": ["A股", "行业", "环保"]},
+        {"keywords": ["养老"], "category": ["A股", "行业", "养老"]},
+        {"keywords": ["消费", "食品饮料", '文体娱乐'],
+         "exclude": ["恒生", "海外", "全球"],
+         "match_any": True, "category": ["A股", "行业", "消费"]},
+        {"keywords": ["信息", "信息技术"], "match_any": True, "category": ["A股", "行业", "信息"]},
+        {"keywords": ["农业"], "category": ["A股", "行业", "农业"]},
+        
+        # 能源相关
+        {"exact_match": ["国投电力", "盐湖股份", "淮北矿业"], "category": ["A股", "行业", "能源"]},
+        {"keywords": ["能源", "电力"], 
+         "match_any": True,
+         "exclude": ["恒生", "海外", "全球"],
+         "category": ["A股", "行业", "能源"]},
+
+        # 红利分类规则
+        {"keywords": ["红利"], "and_keywords": ["恒生", "港股", "央企"],
+         "category": ["海外新兴", "策略", "红利"]},
+        {"keywords": ["红利"],
+         "exclude": ["恒生", "港股", "央企"],
+         "category": ["A股", "策略", "红利"]},
+        {"keywords": ["500行业中性低波动指"],
+         "category": ["A股", "策略", "500低波动"]},
+
+        # 海外分类规则 - 香港市场
+        {"keywords": ["恒生科技"], "category": ["海外新兴", "海外科技", "恒生科技"]},
+        {"keywords": ["恒生医疗", "博时恒生医疗"], "match_any": True, "category": ["海外新兴", "海外医疗", "恒生医疗"]},
+        {"keywords": ["恒生消费"], "category": ["海外新兴", "香港", "恒生消费"]},
+        {"keywords": ["恒生"], 
+         "exclude": ["科技", "医疗", "消费", "红利"],
+         "category": ["海外新兴", "香港", "恒生"]},
+
+        # 海外分类规则 - 成熟市场
+        {"keywords": ["全球医疗"], "match_any": True, "category": ["海外成熟", "全球", "全球医疗"]},
+
+        # 海外互联网
+        {"keywords": ["互联网", "中概"], "match_any": True, "category": ["海外新兴", "海外科技", "海外互联"]},
+
+        # 证券行业
+        {"keywords": ["证券", "非银"], "match_any": True, "and_keywords": ["港股"],
+         "category": ["海外新兴", "行业", "非银"]},
+        {"keywords": ["证券", "非银"], "match_any": True, "category": ["A股", "行业", "证券"]},
+
+        # A股分类规则 - 宽基指数
+        {"keywords": ["500", "中证500"], "match_any": True, "category": ["A股", "中小盘", "500"]},
+        {"keywords": ["300", "沪深300"], "match_any": True, "category": ["A股", "大盘", "300"]},
+        {"keywords": ["创业板"], "category": ["A股", "中小盘", "创业板"]},
+
+        # 其他分类
+        {"keywords": ["债"], "and_keywords": ["国开债"], "category": ["债券", "国内债券", "纯债"]},
+        {"keywords": ["债"], "category": ["债券", "美债", "超长期债券"]},
+        {"regex": r"货币|添益|宝货币|现金|天添宝|添利宝", "category": ["货币", "货币", "货币"]},
+
+        # 默认分类
+        {"default": True, "category": ["其他", "其他", "其他"]}
+    ]
+}
+
+
+# 规则集指纹
+def rules_fingerprint(rules=None):
+    """根据规则内容计算指纹，规则的任何改动（包括修改DEFAULT_CLASSIFICATION_RULES）都会得到新的指纹"""
+    if rules is None:
+        rules = DEFAULT_CLASSIFICATION_RULES["rules"]
+    payload = json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -1,17 +1,31 @@
-import json
 import pandas as pd
-import plotly.express as px
 import os
 
-from sunburst.classify import classify_holding
+from models import DETAIL_FIELDS, HoldingsTable
+from profiling import span
+from sunburst.classify import (classify_holding, classify_holdings, compile_rules, default_classification_cache,
+                               rules_fingerprint)
+from sunburst.report import build_report, print_report, save_report
+from sunburst.rollup import LEVELS, compute_rollup, rollup_level, rollup_percentages
 
 
-# 创建旭日图数据结构
-def create_sunburst_data(portfolio_data, verbose_classify=False):
-    holdings = []
+# 逐条校验并分类持仓
+def iter_holdings(items, verbose_classify=False, rules=None, rule_set=None, cache=None):
+    """
+    逐条校验市值并分类，产出旭日图所需的持仓记录，可以边解析边分类
 
-    # 处理统一格式的数据
-    for item in portfolio_data.get('data', []):
+    rule_set为预编译的CompiledRuleSet，默认按规则内容复用已编译的规则集；
+    cache为ClassificationCache，默认使用进程内缓存；
+    需要打印详细分类过程时仍使用classify_holding逐条规则匹配
+    """
+    if verbose_classify:
+        rule_set = None
+    elif rule_set is None:
+        rule_set = compile_rules(rules)
+    if cache is None:
+        cache = default_classification_cache
+
+    for item in items:
         name = item.get('name', '')
         code = item.get('code', '')
         source_type = item.get('source_type', '未知')
@@ -28,12 +42,15 @@ def create_sunburst_data(portfolio_data, verbose_classify=False):
             print(f"错误: 项目 '{name}' (代码: {code}) 的市值为 {value}，无效")
             continue
             
-        level1, level2, level3 = classify_holding(name, code, verbose=verbose_classify)
+        if rule_set is not None:
+            level1, level2, level3 = cache.classify(rule_set, name, code)
+        else:
+            level1, level2, level3 = classify_holding(name, code, rules=rules, verbose=True)
         
         # 打印最终分类结果
         print(f"分类结果: '{name}' (代码: {code}) => {level1}/{level2}/{level3}")
         
-        holdings.append({
+        holding = {
             'name': name,
             'code': code,
             'value': value,
@@ -41,80 +58,124 @@ def create_sunburst_data(portfolio_data, verbose_classify=False):
             'level2': level2,
             'level3': level3,
             'source': source_type  # 保存来源信息，便于后续分析
-        })
-
-    if not holdings:
+        }
+        # 保留其余投资信息（持有数量、成本价等），供保存历史快照
+        for field in DETAIL_FIELDS:
+            if item.get(field) is not None:
+                holding[field] = item[field]
+        yield holding
+
+# 由分类后的持仓记录（字典列表或HoldingsTable）构建数据框
+def holdings_to_dataframe(holdings):
+    if not len(holdings):
         raise ValueError("没有找到任何有效的 market_value 数据，无法生成旭日图")
-        
+
+    if isinstance(holdings, HoldingsTable):
+        return holdings.to_dataframe()
     return pd.DataFrame(holdings)
 
+# 创建旭日图数据结构
+def create_sunburst_data(portfolio_data, verbose_classify=False, cache=None):
+    """
+    校验市值并分类，返回持仓数据框
+
+    portfolio_data为OCR结果字典（data为投资记录列表），或解析器直接追加得到的HoldingsTable
+    """
+    if isinstance(portfolio_data, HoldingsTable):
+        table = portfolio_data
+    else:
+        items = portfolio_data.get('data', [])
+
+        # 需要打印详细分类过程时逐条分类
+        if verbose_classify:
+            return holdings_to_dataframe(list(iter_holdings(items, verbose_classify, cache=cache)))
+
+        table = HoldingsTable(items)
+
+    # 直接由按列存储的表构建数据框，再批量校验、分类
+    df = table.to_dataframe()
+
+    # 直接获取 market_value，不存在则报错
+    missing = df['value'].isna()
+    if missing.any():
+        for name, code in zip(df.loc[missing, 'name'], df.loc[missing, 'code']):
+            print(f"错误: 项目 '{name}' (代码: {code}) 没有 market_value 数据，将被跳过")
+        df = df[~missing]
+
+    # 进行数据检查
+    invalid = df['value'] <= 0
+    if invalid.any():
+        for name, code, value in zip(df.loc[invalid, 'name'], df.loc[invalid, 'code'], df.loc[invalid, 'value']):
+            print(f"错误: 项目 '{name}' (代码: {code}) 的市值为 {value}，无效")
+        df = df[~invalid]
+    df = df.reset_index(drop=True)
+
+    if df.empty:
+        raise ValueError("没有找到任何有效的 market_value 数据，无法生成旭日图")
+
+    levels = classify_holdings(df['name'], df['code'], cache=cache or default_classification_cache)
+
+    # 打印最终分类结果
+    for name, code, level1, level2, level3 in zip(df['name'], df['code'], levels['level1'],
+                                                  levels['level2'], levels['level3']):
+        print(f"分类结果: '{name}' (代码: {code}) => {level1}/{level2}/{level3}")
+
+    df[LEVELS] = levels
+    return df
+
 # 绘制旭日图
-def plot_sunburst(df, output_file="portfolio_sunburst.html"):
-    # 按层级聚合数据
-    grouped_df = df.groupby(['level1', 'level2', 'level3']).agg({'value': 'sum'}).reset_index()
-
-    # 计算每一层的百分比
-    total_value = grouped_df['value'].sum()
-    grouped_df['percentage'] = grouped_df['value'] / total_value * 100
-
-    # 创建一个百分比数据字典，用于JavaScript
-    percentages_dict = {}
-    # 先处理所有完整路径（三级分类）
-    for _, row in grouped_df.iterrows():
-        # 构建完整路径ID
-        id_path = '/'.join(filter(None, [row['level1'], row['level2'], row['level3']]))
-        percentages_dict[id_path] = row['percentage']
-        
-        # 同时处理一级和二级路径
-        if row['level1']:
-            # 一级路径
-            level1_path = row['level1']
-            if level1_path not in percentages_dict:
-                # 计算一级分类的百分比
-                level1_percentage = grouped_df[grouped_df['level1'] == level1_path]['value'].sum() / total_value * 100
-                percentages_dict[level1_path] = level1_percentage
-            
-            # 二级路径（如果存在）
-            if row['level2']:
-                level2_path = f"{row['level1']}/{row['level2']}"
-                if level2_path not in percentages_dict:
-                    # 计算二级分类的百分比
-                    level2_filter = (grouped_df['level1'] == row['level1']) & (grouped_df['level2'] == row['level2'])
-                    level2_percentage = grouped_df[level2_filter]['value'].sum() / total_value * 100
-                    percentages_dict[level2_path] = level2_percentage
+def plot_sunburst(df, output_file="portfolio_sunburst.html", rollup=None, plotlyjs='cdn', plotlyjs_dir=None):
+    """
+    绘制旭日图并保存为HTML
+
+    plotlyjs为plotly.js的引入方式：cdn(默认，需要联网)、inline(内嵌，离线可用)、
+    shared(在plotlyjs_dir中缓存一份plotly.js供多个报告共用，默认与输出文件同目录)
+    """
+    # plotly只在绘图时导入，只分类、汇总的调用方不必加载
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+
+    from sunburst.html_output import write_figure_html
+
+    # 按层级汇总（一次计算出所有分类节点的市值和占比）
+    if rollup is None:
+        rollup = compute_rollup(df)
+
+    # 各节点的百分比（供核对）
+    percentages_dict = rollup_percentages(rollup)
 
     # 可以添加这行代码以验证所有路径百分比
     print(f"已生成 {len(percentages_dict)} 个百分比映射")
     for path, percentage in sorted(percentages_dict.items()):
         print(f"路径: {path}, 百分比: {percentage:.1f}%")
 
-    # 创建旭日图 - 使用更丰富的色彩方案
-    fig = px.sunburst(
-        grouped_df,
-        path=['level1', 'level2', 'level3'],
-        values='value',
-        color='level1',
-        color_discrete_sequence=px.colors.qualitative.Bold,
-        hover_data=['percentage'],
-        custom_data=['percentage', 'level3', 'level1']
-    )
-
-    # 恢复原始的文本模板，但确保百分比显示正确
-    fig.update_traces(
-        texttemplate='%{label} %{customdata[0]:.1f}%',
-        hovertemplate='<b>%{label}</b><br>占比: %{customdata[0]:.2f}%<br>价值: %{value:,.0f}',
+    # 直接由分类树汇总构建旭日图：每个节点的文字和悬停数据都在Python中算好，
+    # 浏览器端不再需要修正百分比
+    nodes = rollup[rollup['depth'] <= 3]
+    # 一级分类按名称顺序分配颜色，子分类沿用所属一级分类的颜色
+    palette = qualitative.Bold
+    level1_colors = {name: palette[i % len(palette)] for i, name in enumerate(rollup_level(rollup, 1)['level1'])}
+
+    fig = go.Figure(go.Sunburst(
+        ids=nodes['id'],
+        parents=nodes['parent'],
+        labels=nodes['label'],
+        values=nodes['value'],
+        branchvalues='total',
+        text=[f"{label} {percentage:.1f}%" for label, percentage in zip(nodes['label'], nodes['percentage'])],
+        customdata=nodes[['percentage']].to_numpy(),
+        texttemplate='%{text}',
+        hovertemplate='<b>%{label}</b><br>占比: %{customdata[0]:.2f}%<br>价值: %{value:,.0f}<extra></extra>',
+        marker=dict(colors=nodes['level1'].map(level1_colors)),
         insidetextorientation='radial',
         textfont=dict(size=16, family="Arial, sans-serif", color="white")
-    )
+    ))
 
     # 从外部文件读取 JavaScript 代码
     js_file_path = os.path.join(os.path.dirname(__file__), 'sunburst_chart.js')
     try:
         with open(js_file_path, 'r', encoding='utf-8') as js_file:
             js_code = js_file.read()
-            # 注入Python计算的百分比数据
-            js_code = js_code.replace('const pythonPercentages = JSON_DATA_FROM_PYTHON || {};', 
-                               f'const pythonPercentages = {json.dumps(percentages_dict)} || {{}};')
     except FileNotFoundError:
         print(f"警告: JavaScript 文件 {js_file_path} 未找到，图表交互功能可能受限")
         js_code = ""
@@ -150,110 +211,74 @@ def plot_sunburst(df, output_file="portfolio_sunburst.html"):
         }
     }
 
-    html_content = fig.to_html(config=config, include_plotlyjs='cdn')
-    html_content = html_content.replace('</body>', js_code + '</body>')
-
-    # 添加唯一ID给图表元素
-    html_content = html_content.replace('<div id="plotly-html-element"', '<div id="sunburst-chart"')
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    write_figure_html(fig, output_file, config=config, post_script=js_code,
+                      plotlyjs=plotlyjs, plotlyjs_dir=plotlyjs_dir)
 
     return fig
 
 # 打印投资组合摘要数据
-def print_portfolio_summary(df):
+def print_portfolio_summary(df, rollup=None, report=None):
     """打印投资组合的详细数据，包括各分类的市值和占比"""
-    # 按层级聚合数据
-    grouped_df = df.groupby(['level1', 'level2', 'level3']).agg({'value': 'sum'}).reset_index()
-
-    # 计算每一层的百分比
-    total_value = grouped_df['value'].sum()
-    grouped_df['percentage'] = grouped_df['value'] / total_value * 100
-
-    # 排序后的数据
-    sorted_df = grouped_df.sort_values('value', ascending=False)
-
-    # 打印总计
-    print("\n===== 投资组合总览 =====")
-    print(f"总市值: {total_value:,.2f}")
-    print("\n")
-
-    # 打印一级分类汇总
-    print("===== 一级分类汇总 =====")
-    level1_summary = df.groupby('level1')['value'].sum().sort_values(ascending=False)
-    level1_percentage = level1_summary / total_value * 100
-    for category, value in level1_summary.items():
-        print(f"{category}: {value:,.2f} ({level1_percentage[category]:.2f}%)")
-    print("\n")
-
-    # 打印二级分类汇总
-    print("===== 二级分类汇总 =====")
-    level2_summary = df.groupby(['level1', 'level2'])['value'].sum().sort_values(ascending=False)
-    for (cat1, cat2), value in level2_summary.items():
-        percentage = value / total_value * 100
-        print(f"{cat1} - {cat2}: {value:,.2f} ({percentage:.2f}%)")
-    print("\n")
-
-    # 打印所有详细持仓
-    print("===== 详细持仓数据 =====")
-    print(f"{'一级分类':<10} {'二级分类':<10} {'三级分类':<10} {'市值':>12} {'占比':>8}")
-    print("-" * 60)
-    for _, row in sorted_df.iterrows():
-        print(f"{row['level1']:<10} {row['level2']:<10} {row['level3']:<10} {row['value']:>12,.2f} {row['percentage']:>7.2f}%")
-    
-    # 添加按分类的具体持仓明细
-    print("\n===== 分类持仓明细 =====")
-    # 按一级分类排序
-    for level1, group1 in sorted(df.groupby('level1'), key=lambda x: x[1]['value'].sum(), reverse=True):
-        level1_value = group1['value'].sum()
-        level1_percentage = level1_value / total_value * 100
-        print(f"\n## {level1} (总市值: {level1_value:,.2f}, 占比: {level1_percentage:.2f}%)")
-        
-        # 按二级分类排序
-        for level2, group2 in sorted(group1.groupby('level2'), key=lambda x: x[1]['value'].sum(), reverse=True):
-            level2_value = group2['value'].sum()
-            level2_percentage = level2_value / total_value * 100
-            print(f"\n### {level2} (市值: {level2_value:,.2f}, 占比: {level2_percentage:.2f}%)")
-            
-            # 按三级分类排序
-            for level3, group3 in sorted(group2.groupby('level3'), key=lambda x: x[1]['value'].sum(), reverse=True):
-                level3_value = group3['value'].sum()
-                level3_percentage = level3_value / total_value * 100
-                print(f"\n#### {level3} (市值: {level3_value:,.2f}, 占比: {level3_percentage:.2f}%)")
-                
-                # 打印该分类下的具体持仓
-                print(f"{'名称':<20} {'代码':<10} {'市值':>12} {'占比':>8}")
-                print("-" * 60)
-                # 按市值排序具体持仓
-                sorted_holdings = group3.sort_values('value', ascending=False)
-                for _, holding in sorted_holdings.iterrows():
-                    holding_percentage = holding['value'] / total_value * 100
-                    print(f"{holding['name']:<20} {holding['code']:<10} {holding['value']:>12,.2f} {holding_percentage:>7.2f}%")
-
-    return grouped_df  # 返回处理后的数据，可能对后续处理有用
+    # 所有汇总数据一次算好，整份文本拼好后一次性输出
+    if rollup is None:
+        rollup = compute_rollup(df)
+    if report is None:
+        report = build_report(df, rollup)
+    print_report(report)
+
+    return rollup_level(rollup, 3)[LEVELS + ['value', 'percentage']]  # 返回处理后的数据，可能对后续处理有用
 
 # 主函数
-def generate_portfolio_sunburst(input_data, output_html="portfolio_sunburst.html", print_summary=True, verbose_classify=False):
+def generate_portfolio_sunburst(input_data, output_html="portfolio_sunburst.html", print_summary=True, verbose_classify=False,
+                               report_files=None, plotlyjs='cdn', plotlyjs_dir=None,
+                               snapshot_store=None, snapshot_date=None, snapshot_label=None):
     """生成投资组合旭日图
 
     Args:
-        input_data: 可以是JSON文件路径或直接的数据字典
+        input_data: 数据字典，或create_sunburst_data/流水线已分类好的持仓DataFrame
         output_html: 输出HTML文件路径，默认为"portfolio_sunburst.html"
         print_summary: 是否打印投资组合摘要数据，默认为True
         verbose_classify: 是否打印详细的分类过程，默认为False
+        report_files: 额外保存的报告文件路径列表，格式由扩展名决定（json/csv/txt）
+        plotlyjs: plotly.js的引入方式，cdn/inline/shared，默认为cdn
+        plotlyjs_dir: shared模式下共用plotly.js的目录，默认与输出文件同目录
+        snapshot_store: SnapshotStore，传入时把本次持仓和分类汇总保存为一份历史快照
+        snapshot_date: 快照所属日期，默认为当天
+        snapshot_label: 快照说明
 
     Returns:
         plotly.graph_objects.Figure: 生成的旭日图对象
     """
     # 创建数据框
-    df = create_sunburst_data(input_data, verbose_classify=verbose_classify)
+    if isinstance(input_data, pd.DataFrame):
+        df = input_data
+    else:
+        with span('classify.dataframe'):
+            df = create_sunburst_data(input_data, verbose_classify=verbose_classify)
 
     # 打印投资组合摘要
-    if print_summary:
-        print_portfolio_summary(df)
+    # 摘要和旭日图共用同一份分类汇总
+    with span('render.rollup', holdings=len(df)):
+        rollup = compute_rollup(df)
+
+    with span('render.report'):
+        report = build_report(df, rollup) if print_summary or report_files else None
+
+        if print_summary:
+            print_portfolio_summary(df, rollup, report)
+
+        for report_file in report_files or []:
+            save_report(report, report_file)
+            print(f"投资组合报告已保存至: {report_file}")
+
+    if snapshot_store is not None:
+        with span('render.snapshot'):
+            snapshot_id = snapshot_store.add_snapshot(df, snapshot_date=snapshot_date, label=snapshot_label,
+                                                      rollup=rollup, rules_fingerprint=rules_fingerprint())
+        print(f"已保存历史快照 #{snapshot_id}: {snapshot_store.path}")
 
     # 绘制并返回旭日图
-    fig = plot_sunburst(df, output_html)
+    with span('render.html', plotlyjs=plotlyjs):
+        fig = plot_sunburst(df, output_html, rollup, plotlyjs=plotlyjs, plotlyjs_dir=plotlyjs_dir)
 
     return fig
\ No newline at end of file
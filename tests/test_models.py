@@ -0,0 +1,42 @@
+import math
+import unittest
+
+from models import HoldingsTable
+from sunburst.rollup import compute_rollup
+from sunburst.sunburst import create_sunburst_data
+
+
+class HoldingsTableTest(unittest.TestCase):
+    """按列存储的持仓表要能接收保存的OCR结果、/classify请求中各种类型的值"""
+
+    def test_non_string_names_and_codes(self):
+        table = HoldingsTable([
+            {'name': '沪深300ETF', 'code': 510300, 'market_value': 5000.0, 'source_type': 'huabao'},
+            {'name': 'x', 'code': math.nan, 'market_value': 1200},
+            {'name': None, 'code': None, 'market_value': 300},
+        ])
+        df = table.to_dataframe()
+        self.assertEqual(list(df['code']), ['510300', '', ''])
+        self.assertEqual(list(df['name']), ['沪深300ETF', 'x', ''])
+
+    def test_lenient_numbers(self):
+        df = HoldingsTable([{'name': 'a', 'market_value': '1,234.5', 'quantity': '--'}]).to_dataframe()
+        self.assertEqual(df['value'].iloc[0], 1234.5)
+        self.assertNotIn('quantity', df.columns)
+
+    def test_create_sunburst_data_with_numeric_code(self):
+        df = create_sunburst_data({'data': [{'name': '沪深300ETF', 'code': 510300, 'market_value': 5000.0},
+                                            {'name': '现金', 'market_value': 1000.0}]})
+        self.assertEqual(len(df), 2)
+        self.assertEqual(df['value'].sum(), 6000.0)
+
+    def test_rollup_holdings_only_observed(self):
+        # 名称、代码为Categorical时，持仓层只应包含实际出现的(名称, 代码)组合
+        records = [{'name': f"基金{i}", 'code': f"{i:06d}", 'value': 100.0 + i,
+                    'level1': 'A股', 'level2': '宽基', 'level3': str(i % 3)} for i in range(50)]
+        rollup = compute_rollup(HoldingsTable(records).to_dataframe(), include_holdings=True)
+        self.assertEqual((rollup['depth'] == 4).sum(), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+try:
+    import rapidocr_onnxruntime  # noqa: F401
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    rapidocr_onnxruntime = None
+
+from serve import PortfolioServer
+
+
+def make_screenshot(seed, count=2):
+    """生成华宝持仓截图的PNG字节，每个字段单独一行（内置字体只有拉丁字符）"""
+    font = ImageFont.load_default(size=36)
+    lines = []
+    for i in range(count):
+        n = seed * 100 + i
+        lines += [f"ALPHA{n:03d}", f"{10 + i}.125", str(100 * (i + 1)), f"{i * 3}.50", f"600{n:03d}.SH",
+                  f"{i + 1}.25%", f"{11 + i}.250", "0", f"{i + 2}.10%", f"{1000 * (i + 1)}.00"]
+    image = Image.new('RGB', (1080, 200 + 50 * len(lines)), 'white')
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((60, 100 + i * 50), line, fill='black', font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@unittest.skipIf(rapidocr_onnxruntime is None, '需要rapidocr_onnxruntime和Pillow')
+class PortfolioServerTest(unittest.TestCase):
+    """在本机随机端口启动服务，通过HTTP调用各接口"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.TemporaryDirectory()
+        # 缓存上限极小，每批之后所有条目都应被淘汰
+        cls.server = PortfolioServer(port=0, workers=1, cache_dir=cls.cache_dir.name, cache_size_mb=0.000001)
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        asyncio.run_coroutine_threadsafe(cls.server.start(), cls.loop).result(timeout=600)
+        cls.base_url = f"http://127.0.0.1:{cls.server.port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run_coroutine_threadsafe(cls.server.stop(), cls.loop).result(timeout=60)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join(timeout=60)
+        cls.loop.close()
+        cls.cache_dir.cleanup()
+
+    def request(self, path, body=None):
+        """返回 (状态码, JSON响应)"""
+        request = urllib.request.Request(self.base_url + path, data=body, method='POST' if body is not None else 'GET')
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return response.status, json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read().decode('utf-8'))
+
+    def test_health(self):
+        status, body = self.request('/health')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['status'], 'ok')
+        self.assertEqual(len(body['engines']), 1)
+
+    def test_classify(self):
+        payload = {'data': [{'name': '沪深300ETF', 'code': 510300, 'market_value': 5000.0}], 'cash': 1000}
+        status, body = self.request('/classify', json.dumps(payload).encode('utf-8'))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body['holdings']), 2)
+        self.assertEqual(sum(holding['value'] for holding in body['holdings']), 6000.0)
+
+    def test_errors(self):
+        self.assertEqual(self.request('/classify', b'not json')[0], 400)
+        self.assertEqual(self.request('/missing')[0], 404)
+        self.assertEqual(self.request('/health', b'')[0], 405)
+
+    def test_ocr_and_cache_eviction(self):
+        status, body = self.request('/ocr?channel=huabao', make_screenshot(0))
+        self.assertEqual(status, 200)
+        self.assertEqual(body['channel'], 'huabao')
+        self.assertEqual(len(body['data']), 2)
+        entries = [name for name in os.listdir(self.cache_dir.name) if name.endswith('.json')]
+        self.assertEqual(entries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
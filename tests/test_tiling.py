@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+try:
+    import rapidocr_onnxruntime  # noqa: F401
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    rapidocr_onnxruntime = None
+
+import ocr
+
+
+def make_tall_screenshot(path, seed, count=12):
+    """生成超过LARGE_IMAGE_SIDE的竖长华宝持仓截图，每个字段单独一行（内置字体只有拉丁字符）"""
+    font = ImageFont.load_default(size=36)
+    lines = []
+    for i in range(count):
+        n = seed * 100 + i
+        lines += [f"ALPHA{n:03d}", f"{10 + i}.125", str(100 * (i + 1)), f"{i * 3}.50", f"600{n:03d}.SH",
+                  f"{i + 1}.25%", f"{11 + i}.250", "0", f"{i + 2}.10%", f"{1000 * (i + 1)}.00"]
+    line_height = 50
+    height = max(ocr.LARGE_IMAGE_SIDE + 500, 200 + line_height * len(lines))
+    image = Image.new('RGB', (1080, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((60, 100 + i * line_height), line, fill='black', font=font)
+    image.save(path)
+
+
+@unittest.skipIf(rapidocr_onnxruntime is None, '需要rapidocr_onnxruntime和Pillow')
+class TiledOCRTest(unittest.TestCase):
+    """分块识别的结果不应受并行方式影响：单进程和多个工作进程（每个进程限制推理线程数）识别结果相同"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.TemporaryDirectory()
+        for seed in range(2):
+            make_tall_screenshot(os.path.join(cls.work_dir.name, f"tall_{seed}.png"), seed)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.work_dir.cleanup()
+
+    def test_select_tiled_mode(self):
+        self.assertEqual(ocr.select_engine_mode(1080, ocr.LARGE_IMAGE_SIDE + 1), 'tiled')
+        self.assertEqual(ocr.select_engine_mode(1080, ocr.LARGE_IMAGE_SIDE + 1, tile=False), 'large')
+
+    def test_tiles_cover_image(self):
+        tiles = ocr.split_tiles(5500, 2000, 200)
+        self.assertEqual(tiles[0][2], 0)
+        self.assertEqual(tiles[-1][3], 5500)
+        for previous, tile in zip(tiles, tiles[1:]):
+            self.assertEqual(previous[3], tile[2])
+
+    def test_same_result_with_one_and_many_workers(self):
+        serial = ocr.process_images(self.work_dir.name, batch=True, channel='huabao', workers=1, stitch=False)
+        parallel = ocr.process_images(self.work_dir.name, batch=True, channel='huabao', workers=2, stitch=False)
+        self.assertGreater(len(serial['data']), 0)
+        self.assertEqual(serial['data'], parallel['data'])
+
+
+if __name__ == '__main__':
+    unittest.main()